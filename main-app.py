@@ -1,11 +1,13 @@
+import os
 import streamlit as st
-from PIL import Image
 import io
-from modules import ai_bot, schemes_mara
-from modules.crop_disease_detector import predict_crop_disease
-import pandas as pd
+from modules import resources
 from style import load_style
-from modules.news_fetcher import scrapper 
+
+# Heavy subsystems (TensorFlow, LangChain, Groq/Google clients, scraping) are
+# imported the first time their section is opened, not at startup.
+# Import time and memory per module are part of resources.report().
+SECTION_MODULES = ["modules.ai_bot", "modules.inference_client", "modules.schemes", "modules.news_fetcher"]
 
 # Load custom styles
 load_style()
@@ -55,7 +57,11 @@ if st.session_state.language == "mr":
     # Agricultural News Section
     agri_news_subtitle = "ताज्या कृषी बातम्या"
     fetch_latest_text = "ताज्या बातम्या आणा"
-    success_news_text = "ताज्या बातम्या यशस्वीपणे आणल्या!"
+    refresh_requested_text = "ताज्या बातम्या पार्श्वभूमीत आणल्या जात आहेत. नवीन बातम्या लवकरच दिसतील."
+    news_up_to_date_text = "बातम्या आधीच अद्ययावत आहेत."
+    news_age_text = "शेवटचे अद्यतन: {} {} पूर्वी"
+    news_age_units = ("मिनिटे", "तास", "दिवस")
+    news_page_label = "पान"
 else:
     # Sidebar & Navigation
     sidebar_title = "Navigation"
@@ -89,7 +95,11 @@ else:
     # Agricultural News Section
     agri_news_subtitle = "Latest Agricultural News"
     fetch_latest_text = "Fetch Latest"
-    success_news_text = "Latest news fetched successfully!"
+    refresh_requested_text = "Fetching the latest news in the background. New articles will appear shortly."
+    news_up_to_date_text = "News is already up to date."
+    news_age_text = "Last updated {} {} ago"
+    news_age_units = ("minutes", "hours", "days")
+    news_page_label = "Page"
 
 # --------------------------------------------------------------------
 # --- Sidebar Navigation ---
@@ -102,6 +112,7 @@ section = st.sidebar.radio(go_to_label,
 if section == ai_chatbot_text:
     st.markdown(f"<h1 class='main-title'>{ai_chatbot_page_title}</h1>", unsafe_allow_html=True)
     st.markdown(ai_chatbot_description)
+    ai_bot = resources.import_module("modules.ai_bot")
     # Pass the language variable to the chatbot UI function.
     ai_bot.chatbot_ui(language=st.session_state.language)
 
@@ -113,6 +124,10 @@ elif section == crop_detection_text:
     uploaded_image = st.file_uploader(crop_upload_text, type=["jpg", "jpeg", "png"], key="crop_upload")
     
     if uploaded_image:
+        from PIL import Image
+        # Runs the model in this process, or sends the image to the inference
+        # service when CROP_INFERENCE_URL is set (modules/inference_client.py)
+        predict_crop_disease = resources.import_module("modules.inference_client").predict_crop_disease
         image = Image.open(uploaded_image)
         caption_text = "Uploaded Crop Image" if st.session_state.language == "en" else "अपलोड केलेले पिकाचे चित्र"
         st.image(image, caption=caption_text, width=300)
@@ -148,38 +163,72 @@ elif section == crop_detection_text:
 elif section == govt_schemes_text:
     st.markdown(f"<h1 class='main-title'>{govt_schemes_page_title}</h1>", unsafe_allow_html=True)
     st.markdown(govt_schemes_description)
+    schemes = resources.import_module("modules.schemes")
     # Pass the language variable to the chatbot UI function.
-    schemes_mara.chatbot_ui(language=st.session_state.language)
+    schemes.chatbot_ui(language=st.session_state.language)
 
 # --------------------------------------------------------------------
 # --- 4. Agricultural News Section ---
 elif section == agri_news_text:
-    # Function to load the CSV file
-    def load_news_data(file_path):
-        return pd.read_csv(file_path)
-
-    # Function to display news in card format
-    def display_news(news_df):
-        for _, row in news_df.iterrows():
-            with st.container():
-                st.markdown(
-                    f"""
-                    <div style="border:1px solid #ddd; padding:10px; border-radius:10px; margin-bottom:10px; background-color:#f9f9f9;">
-                        <h4 style="color:#2E7D32;">{row['Title']}</h4>
-                        <p>{row['Desc']}</p>
-                        <a href="{row['Link']}" target="_blank" style="color:#1E88E5; text-decoration:none;">Read more</a>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-    
-    news_data = load_news_data("assets/agriculture_news.csv")
+    # Crawls run in the background (modules/news_refresher.py); this page only
+    # reads the latest published snapshot.
+    news_refresher = resources.import_module("modules.news_refresher")
+    news_page = resources.import_module("modules.news_page")
+
+    NEWS_PAGE_SIZE = 20
+
+    # Function to load the CSV file. The parsed feed is cached per process and
+    # keyed on the file's mtime, so it is re-read only when a new snapshot is published.
+    @st.cache_data(show_spinner=False, max_entries=2)
+    def load_news_data(file_path, mtime):
+        return news_page.load_news(file_path)
+
+    # Function to render one page of news cards as a single HTML block
+    @st.cache_data(show_spinner=False, max_entries=64)
+    def render_news_page(file_path, mtime, page, page_size):
+        return news_page.render_news_page(load_news_data(file_path, mtime), page, page_size)
+
+    news_mtime = os.path.getmtime(news_refresher.NEWS_CSV_PATH)
+    news_data = load_news_data(news_refresher.NEWS_CSV_PATH, news_mtime)
     st.subheader(agri_news_subtitle)
-    display_news(news_data)
+    news_age = news_refresher.last_crawl_age()
+    if news_age is not None:
+        if news_age < 2 * 3600:
+            st.caption(news_age_text.format(int(news_age // 60), news_age_units[0]))
+        elif news_age < 2 * 86400:
+            st.caption(news_age_text.format(int(news_age // 3600), news_age_units[1]))
+        else:
+            st.caption(news_age_text.format(int(news_age // 86400), news_age_units[2]))
+
+    page_count = news_page.page_count(news_data, NEWS_PAGE_SIZE)
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"{news_page_label} (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    st.markdown(
+        render_news_page(news_refresher.NEWS_CSV_PATH, news_mtime, int(page) - 1, NEWS_PAGE_SIZE),
+        unsafe_allow_html=True
+    )
 
     if st.button(fetch_latest_text):
-        scrapper()
-        st.success(success_news_text)
+        if news_refresher.request_refresh():
+            st.info(refresh_requested_text)
+        else:
+            st.info(news_up_to_date_text)
+
+# --------------------------------------------------------------------
+# Once the first page has rendered, import the remaining sections and load the
+# shared models and vector stores in a background thread (once per process),
+# so later clicks don't pay for them. Set PREWARM_RESOURCES=0 to disable.
+if os.environ.get("PREWARM_RESOURCES", "1") != "0":
+    prewarm = [resources.register_module(name) for name in SECTION_MODULES]
+    resources.warm(prewarm + resources.warm_names(), background=True)
+
+# Keep the news feed fresh from a background thread (once per process).
+resources.import_module("modules.news_refresher").start()
+
+# Metrics endpoint/file and the runtime-switchable profiler (once per process;
+# off unless METRICS_PORT or METRICS_FILE is set, see modules/tracing.py).
+resources.import_module("modules.tracing").start()
 
 # --------------------------------------------------------------------
 # Optionally add a footer (if your footer function is defined accordingly)
@@ -1,77 +1,61 @@
 import time
 import streamlit as st
 import os
-from langchain import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_groq import ChatGroq
-from langchain.vectorstores import FAISS
-from dotenv import load_dotenv
+from modules import resources, tracing
+from modules.chat_memory import ChatMemory, llm_summarizer
+from modules.llm_streaming import render_stream, stream_tokens
+from modules.prompts import build_context, compile_prompt
 
-# Access Streamlit Secrets directly
-google_api_key = st.secrets["general"]["GOOGLE_API_KEY"]
-groq_api_key = st.secrets["general"]["GROQ_API_KEY"]
-# Ensure they're available as environment variables if needed elsewhere in the app
-os.environ["GOOGLE_API_KEY"] = google_api_key
+ROLE = "Role: AI assistant for agriculture schemes. Answer only scheme-related queries.\n"
 
+# Compiled once per language; the system message is identical for every request in that language
+PROMPTS = {
+    "en": compile_prompt(ROLE + "Note: Please answer in English."),
+    "mr": compile_prompt(ROLE + "Note: Please answer in Marathi"),
+}
 
-# Initialize LLM
-llm_llama3 = ChatGroq(
-    model="llama3.1-8b-8192",
-    temperature=0,
-    api_key=groq_api_key,
-)
+# Hybrid BM25 + FAISS retriever over the current store version (shared by every session, see modules/resources.py)
+def load_vectordb():
+    return resources.get("vectordb:Smart Farming").current()
 
-import os
+# Stream the chatbot response with language-specific instructions, piece by piece.
+# Standalone questions are answered from the shared response cache when possible.
+def stream_response(user_input, chat_history, retriever, language="en", use_cache=True):
+    # Traced across its yields, so code running between chunks never records into this request
+    return tracing.trace_stream("chatbot", _stream_response(user_input, chat_history, retriever, language, use_cache))
 
-# Make sure your Google API key is set in the environment variable GOOGLE_API_KEY
-if "GOOGLE_API_KEY" not in os.environ:
-    import getpass
-    os.environ["GOOGLE_API_KEY"] = getpass.getpass("Provide your Google API key here")
+def _stream_response(user_input, chat_history, retriever, language, use_cache):
+    started = time.perf_counter()
+    # Embed the question once: the vector is used for retrieval and for the cache's near-duplicate lookup
+    with tracing.span("embedding"):
+        query_vector = retriever.embeddings.embed_query(user_input)
+    with tracing.span("retrieval"):
+        relevant_docs = retriever.retrieve(user_input, query_vector)
+    retrieved_context = build_context(relevant_docs)
 
-# Initialize embeddings with a specific Google embedding model
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    response_cache = resources.get("response_cache")
+    if use_cache:
+        cached_response = response_cache.get("ai_bot", user_input, language, retrieved_context, query_vector)
+        if cached_response is not None:
+            yield cached_response
+            return
 
+    prompt = PROMPTS.get(language, PROMPTS["en"]).format_messages(
+        chat_history=chat_history, 
+        user_input=user_input, 
+        retrieved_context=retrieved_context
+    )
 
-# Load FAISS vector store
-def load_vectordb():
-    PATH = r"modules\faiss_index_\Smart Farming"
-    persisted_vectorstore = FAISS.load_local(PATH, embeddings, allow_dangerous_deserialization=True)
-    return persisted_vectorstore.as_retriever()
+    chunks = []
+    for chunk in stream_tokens(resources.get("llm"), prompt, started):
+        chunks.append(chunk)
+        yield chunk
+    if use_cache:
+        response_cache.put("ai_bot", user_input, language, retrieved_context, "".join(chunks), query_vector)
 
-# Generate chatbot response with language-specific instructions
-def generate_response(user_input, chat_history, retriever, language="en"):
-    relevant_docs = retriever.get_relevant_documents(user_input)
-    retrieved_context = "\n\n".join([doc.page_content for doc in relevant_docs])
-    
-    # Determine the language instruction for the prompt
-    if language == "mr":
-        language_instruction = "Note: Please answer in Marathi"
-    else:
-        language_instruction = "Note: Please answer in English."
-    
-    template = """
-    Role: AI assistant for agriculture schemes. Answer only scheme-related queries.
-    {language_instruction}
-    Chat History:
-    {chat_history}
-    Context:
-    {retrieved_context}
-    User: {user_input}
-    AI:"""
-    
-    prompt = PromptTemplate(
-        input_variables=["chat_history", "user_input", "retrieved_context", "language_instruction"],
-        template=template
-    )
-    llm_chain = LLMChain(llm=llm_llama3, prompt=prompt)
-    
-    return llm_chain.run({
-        "chat_history": chat_history, 
-        "user_input": user_input, 
-        "retrieved_context": retrieved_context,
-        "language_instruction": language_instruction
-    })
+# Generate the complete chatbot response
+def generate_response(user_input, chat_history, retriever, language="en", use_cache=True):
+    return "".join(stream_response(user_input, chat_history, retriever, language, use_cache))
 
 # Streamlit Chat UI with language parameter
 def chatbot_ui(language="en"):
@@ -82,35 +66,46 @@ def chatbot_ui(language="en"):
     .chat-avatar { width: 40px; height: 40px; border-radius: 50%; }
     </style>""", unsafe_allow_html=True)
 
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    # Structured, token-budgeted conversation memory (see modules/chat_memory.py)
+    if not isinstance(st.session_state.get("chat_history"), ChatMemory):
+        st.session_state.chat_history = ChatMemory()
+    memory = st.session_state.chat_history
 
-    if "retriever" not in st.session_state:
-        st.session_state.retriever = load_vectordb()
+    retriever = load_vectordb()
     
     st.markdown('<div class="chat-container">', unsafe_allow_html=True)
     
-    for message in st.session_state.chat_history:
-        role, content = message.split(":", 1)
-        if role.strip().lower() == "user":
-            st.markdown(f'<div class="user-message">👤 {content.strip()}</div>', unsafe_allow_html=True)
+    for message in memory.messages:
+        if message["role"] == "user":
+            st.markdown(f'<div class="user-message">👤 {message["content"]}</div>', unsafe_allow_html=True)
         else:
-            st.markdown(f'<div class="assistant-message">🤖 {content.strip()}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="assistant-message">🤖 {message["content"]}</div>', unsafe_allow_html=True)
     
     user_input = st.text_input("Type your message...", key="user_input", value="", on_change=lambda: st.session_state.update(send_message=True))
     
     if st.session_state.get("send_message", False) or st.button("Send"):
         if user_input:
-            st.session_state.chat_history.append(f"User: {user_input}")
-            response = generate_response(
-                user_input, 
-                "\n".join(st.session_state.chat_history), 
-                st.session_state.retriever, 
-                language=language
+            st.markdown(f'<div class="user-message">👤 {user_input}</div>', unsafe_allow_html=True)
+            # Tokens are shown as they arrive instead of after the whole answer
+            response = render_stream(
+                stream_response(
+                    user_input, 
+                    memory.prompt_history(), 
+                    retriever, 
+                    language=language,
+                    # Follow-ups depend on the conversation, so only the first question is cached
+                    use_cache=len(memory) == 0
+                ),
+                st.empty(),
+                '<div class="assistant-message">🤖 {}</div>'
             )
-            st.session_state.chat_history.append(f"AI: {response}")
+            memory.add("user", user_input)
+            memory.add("assistant", response)
+            # Older turns go into the rolling summary once the recent window is full,
+            # off the script thread so the rerun isn't held up by the summary call
+            memory.compact_in_background(llm_summarizer(resources.get("llm")))
             st.session_state["send_message"] = False
-            st.experimental_rerun()
+            st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
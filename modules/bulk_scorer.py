@@ -0,0 +1,240 @@
+"""
+Offline crop disease scoring for large batches of field photos.
+
+Streams images from a directory or a tar archive, decodes and resizes them in
+a process pool, normalizes them straight into a reusable batch buffer (the
+same steps as preprocess_image()), runs the model in large batches and
+appends the top-k classes per image to a CSV file or a Parquet dataset
+directory. Images already present in the output are skipped, so an
+interrupted run can simply be started again.
+
+Usage:
+    python -m modules.bulk_scorer photos/ --output scores.csv
+    python -m modules.bulk_scorer photos.tar.gz --output scores.parquet --format parquet
+    python -m modules.bulk_scorer photos/ --compare-resampling
+"""
+import argparse
+import csv
+import io
+import itertools
+import os
+import tarfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+from modules import resources
+from modules.crop_disease_detector import (
+    IMAGE_SIZE, RESAMPLING_FILTERS, compare_resampling, fit_image, normalize_into, top_k_classes,
+)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def iter_images(source):
+    """
+    Yield (key, payload) pairs for every image under source.
+
+    For directories the payload is the file path and the worker opens it
+    itself; for tar archives it is the member's bytes, read sequentially so
+    compressed archives are streamed rather than seeked.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, source), path
+    else:
+        with tarfile.open(source, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+
+
+def _load(key, payload, resample):
+    """
+    Worker: decode and resize one image; errors are returned, not raised.
+
+    Returns uint8 pixels rather than normalized floats, which is a quarter of
+    the bytes to send back to the parent process.
+    """
+    try:
+        source = io.BytesIO(payload) if isinstance(payload, bytes) else payload
+        with Image.open(source) as image:
+            return key, fit_image(image, resample), None
+    except Exception as e:
+        return key, None, str(e)
+
+
+class _CsvSink:
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = fieldnames
+
+    def done_keys(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline="", encoding="utf-8") as file:
+            return {row["image"] for row in csv.DictReader(file)}
+
+    def write(self, rows):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=self.fieldnames)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class _ParquetSink:
+    """Writes one part file per flush into a dataset directory (needs pyarrow)."""
+
+    def __init__(self, path, fieldnames):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from None
+        self.path = path
+        self.fieldnames = fieldnames
+        os.makedirs(path, exist_ok=True)
+
+    def done_keys(self):
+        import pandas as pd
+        keys = set()
+        for name in os.listdir(self.path):
+            if name.endswith(".parquet"):
+                keys.update(pd.read_parquet(os.path.join(self.path, name), columns=["image"])["image"])
+        return keys
+
+    def write(self, rows):
+        import pandas as pd
+        part = f"part-{time.time_ns()}.parquet"
+        tmp_path = os.path.join(self.path, f".{part}.tmp")
+        pd.DataFrame(rows, columns=self.fieldnames).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(self.path, part))
+
+
+def _rows_for(keys, predictions, top_k):
+    rows = []
+    for key, scores in zip(keys, predictions):
+        row = {"image": key, "error": ""}
+        for rank, (label, score) in enumerate(top_k_classes(scores, top_k), start=1):
+            row[f"label_{rank}"] = label
+            row[f"score_{rank}"] = score
+        rows.append(row)
+    return rows
+
+
+def score_images(source, output, fmt="csv", top_k=3, batch_size=64, workers=None, resample="lanczos"):
+    """
+    Score every image under source and append the results to output.
+
+    Args:
+        source (str): Directory of images or a (optionally compressed) tar archive.
+        output (str): CSV file, or directory for a Parquet dataset.
+        fmt (str): "csv" or "parquet".
+        top_k (int): Number of classes to record per image.
+        batch_size (int): Images per forward pass.
+        workers (int): Decode processes (default: one per CPU).
+        resample (str): Resize filter, see RESAMPLING_FILTERS.
+
+    Returns:
+        int: Number of images scored in this run.
+    """
+    fieldnames = ["image"]
+    for rank in range(1, top_k + 1):
+        fieldnames += [f"label_{rank}", f"score_{rank}"]
+    fieldnames.append("error")
+    sink = _ParquetSink(output, fieldnames) if fmt == "parquet" else _CsvSink(output, fieldnames)
+
+    done = sink.done_keys()
+    if done:
+        print(f"Resuming: {len(done)} images already scored in {output}.")
+
+    model = resources.get("crop_model")
+    workers = workers or os.cpu_count() or 1
+    # Enough decoded images in flight to fill the next batch while one is running.
+    max_in_flight = max(batch_size * 2, workers * 4)
+    batch = np.empty((batch_size,) + IMAGE_SIZE + (3,), dtype=np.float32)
+    batch_keys, errors = [], []
+    scored = 0
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal scored
+        rows = []
+        if batch_keys:
+            predictions = model.predict(batch[:len(batch_keys)], batch_size=batch_size, verbose=0)
+            rows += _rows_for(batch_keys, predictions, top_k)
+        rows += [{"image": key, "error": error} for key, error in errors]
+        if rows:
+            sink.write(rows)
+            scored += len(rows)
+            rate = scored / (time.perf_counter() - started)
+            print(f"Scored {scored} images ({rate:.1f} images/s)")
+        batch_keys.clear()
+        errors.clear()
+
+    def collect(finished):
+        for future in finished:
+            key, pixels, error = future.result()
+            if error is not None:
+                errors.append((key, error))
+                continue
+            normalize_into(pixels, batch[len(batch_keys)])
+            batch_keys.append(key)
+            if len(batch_keys) == batch_size:
+                flush()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for key, payload in iter_images(source):
+            if key in done:
+                continue
+            pending.add(pool.submit(_load, key, payload, resample))
+            if len(pending) >= max_in_flight:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        collect(pending)
+    flush()
+    return scored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score crop photos in bulk with the disease model.")
+    parser.add_argument("source", help="Directory of images or tar archive")
+    parser.add_argument("--output", help="CSV file or Parquet dataset directory")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--resample", choices=list(RESAMPLING_FILTERS), default="lanczos",
+                        help="Resize filter; faster filters trade a little fidelity")
+    parser.add_argument("--compare-resampling", action="store_true",
+                        help="Compare resize filters against full-resolution LANCZOS on up to 200 images and exit")
+    args = parser.parse_args()
+
+    if args.compare_resampling:
+        sample = [payload for _, payload in itertools.islice(iter_images(args.source), 200)]
+        report = compare_resampling(sample, model=resources.get("crop_model"))
+        print(f"{'filter':<10} {'ms/image':>9} {'mean abs err':>13} {'top-1 agree':>12}")
+        for name, values in report.items():
+            print(f"{name:<10} {values['seconds_per_image'] * 1000:>9.1f} "
+                  f"{values['mean_abs_error']:>13.4f} {values['top1_agreement']:>12.1%}")
+        return
+    if not args.output:
+        parser.error("--output is required")
+
+    scored = score_images(args.source, args.output, fmt=args.format, top_k=args.top_k,
+                          batch_size=args.batch_size, workers=args.workers, resample=args.resample)
+    print(f"Done: {scored} images scored.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Bounded conversation memory for the chatbots.
+
+Messages are kept as structured {"role", "content"} dicts for display. The
+prompt only gets a token-budgeted view: a rolling summary of older messages
+followed by the most recent messages verbatim. Once there are more than
+CHAT_HISTORY_MESSAGES recent messages, or they no longer fit in
+CHAT_HISTORY_TOKENS, the oldest ones are folded into the summary, so prompt
+size stays flat however long the conversation runs.
+
+The summary is written by an LLM call, so the chat pages fold messages with
+compact_in_background() after a reply instead of making the user wait for
+it; prompt_history() meanwhile keeps serving the previous summary plus the
+recent messages that fit.
+"""
+import os
+import re
+import threading
+
+CHAT_HISTORY_MESSAGES = int(os.environ.get("CHAT_HISTORY_MESSAGES", "6"))
+CHAT_HISTORY_TOKENS = int(os.environ.get("CHAT_HISTORY_TOKENS", "1024"))
+CHAT_SUMMARY_TOKENS = int(os.environ.get("CHAT_SUMMARY_TOKENS", "256"))
+
+ROLE_LABELS = {"user": "User", "assistant": "AI"}
+
+SUMMARY_PROMPT = """Update the summary of a conversation between a farmer and an agriculture assistant.
+Keep facts the farmer gave (crop, location, land size, schemes asked about) and the advice given.
+Write at most {max_words} words, in English, as plain sentences.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+
+Updated summary:"""
+
+_WIDE_CHARS = re.compile(r"[^\x00-\x7f]")
+
+
+def count_tokens(text):
+    """
+    Estimate the number of LLM tokens in a text without loading a tokenizer.
+
+    English averages about four characters per token; Devanagari and other
+    non-ASCII text takes far more tokens per character, counted here as two
+    characters per token. The estimate errs on the high side.
+    """
+    wide = len(_WIDE_CHARS.findall(text))
+    return (len(text) - wide) // 4 + (wide + 1) // 2 + 1
+
+
+def truncate_tokens(text, max_tokens):
+    """Drop text from the start until it fits in max_tokens."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high) // 2
+        if count_tokens(text[middle:]) <= max_tokens:
+            high = middle
+        else:
+            low = middle + 1
+    return "…" + text[low:]
+
+
+def format_messages(messages):
+    return "\n".join(f"{ROLE_LABELS[message['role']]}: {message['content']}" for message in messages)
+
+
+def llm_summarizer(llm, max_tokens=CHAT_SUMMARY_TOKENS):
+    """Return a summarize(summary, messages) function backed by the LLM gateway or a LangChain chat model."""
+    def summarize(summary, messages):
+        prompt = SUMMARY_PROMPT.format(
+            summary=summary or "(none)", transcript=format_messages(messages), max_words=max_tokens * 3 // 4
+        )
+        response = llm.invoke(prompt)
+        return getattr(response, "content", response).strip()
+    return summarize
+
+
+class ChatMemory:
+    """
+    One conversation: every message for display, a summary plus recent messages for the prompt.
+
+    Args:
+        max_messages (int): Recent messages kept verbatim in the prompt.
+        token_budget (int): Token limit for the summary and recent messages together.
+        summary_tokens (int): Token limit for the summary alone.
+    """
+
+    def __init__(self, max_messages=CHAT_HISTORY_MESSAGES, token_budget=CHAT_HISTORY_TOKENS,
+                 summary_tokens=CHAT_SUMMARY_TOKENS):
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.messages = []
+        self.summary = ""
+        self._summarized = 0  # messages[:_summarized] are folded into the summary
+        self._lock = threading.Lock()  # guards summary and _summarized
+        self._compact_lock = threading.Lock()  # one compaction at a time
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, role, content):
+        """Append a message; role is "user" or "assistant"."""
+        self.messages.append({"role": role, "content": content})
+
+    def recent(self):
+        """Messages not yet folded into the summary."""
+        with self._lock:
+            return self.messages[self._summarized:]
+
+    def prompt_history(self):
+        """
+        Return the history text for the prompt, within the token budget.
+
+        The summary comes first, then as many of the most recent messages as fit.
+        """
+        with self._lock:
+            summary, recent = self.summary, self.messages[self._summarized:]
+        header = f"Summary of the earlier conversation: {summary}" if summary else ""
+        used = count_tokens(header) if header else 0
+        lines = []
+        for message in reversed(recent):
+            line = format_messages([message])
+            cost = count_tokens(line)
+            if used + cost > self.token_budget:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(([header] if header else []) + lines[::-1])
+
+    def compact(self, summarize=None):
+        """
+        Fold the oldest recent messages into the summary when over the message or token limit.
+
+        Args:
+            summarize (callable): summarize(summary, messages) -> new summary,
+                e.g. llm_summarizer(llm). Without one, or if it fails, the
+                folded messages are appended to the summary and trimmed.
+
+        Returns:
+            int: Number of messages folded.
+        """
+        with self._compact_lock:
+            return self._compact(summarize)
+
+    def compact_in_background(self, summarize=None):
+        """
+        Run compact() on a daemon thread so the caller doesn't wait for the summary.
+
+        Does nothing while an earlier compaction is still running; the next
+        call folds whatever is over the limit by then.
+
+        Returns:
+            threading.Thread: The compaction thread, or None if none was started.
+        """
+        if self._compact_lock.locked():
+            return None
+        thread = threading.Thread(target=self.compact, args=(summarize,), name="chat-compact", daemon=True)
+        thread.start()
+        return thread
+
+    def _compact(self, summarize):
+        recent = self.recent()
+        summary_before = self.summary
+        fold = max(0, len(recent) - self.max_messages)
+        budget = self.token_budget - self.summary_tokens
+        while fold < len(recent) - 1 and count_tokens(format_messages(recent[fold:])) > budget:
+            fold += 1
+        # Fold whole exchanges so the verbatim part starts with a user message
+        while 0 < fold < len(recent) - 1 and recent[fold]["role"] != "user":
+            fold += 1
+        if not fold:
+            return 0
+
+        folded = recent[:fold]
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(summary_before, folded)
+            except Exception as e:
+                print(f"Conversation summary failed, trimming instead: {e}")
+        if summary is None:
+            summary = f"{summary_before}\n{format_messages(folded)}".strip()
+        with self._lock:
+            self.summary = truncate_tokens(summary, self.summary_tokens)
+            self._summarized += fold
+        return fold
@@ -1,34 +1,303 @@
-# Install required packages if you haven't already
-# pip install langchain-google-genai faiss-cpu langchain-community
+"""
+Build or update a FAISS store from a collection of PDFs.
 
+PDFs are parsed and split in a process pool and their chunks are embedded in
+concurrent batches under an optional requests-per-minute limit, retrying
+with backoff when the API pushes back. The store directory keeps a
+sources.json with the content hash and chunk ids of every PDF, so a rerun
+only parses and embeds PDFs that are new or changed and drops the chunks of
+PDFs that changed or disappeared. The result is written to the directory
+that ai_bot and schemes load (resources.index_path()) as a new version,
+which running apps pick up without a restart (see modules/vector_stores.py).
+
+Usage:
+    python -m modules.create_vector_db --name Schemes --source pdfs/schemes/
+    python -m modules.create_vector_db --name "Smart Farming" --source manifest.txt --requests-per-minute 1000
+    python -m modules.create_vector_db --name Schemes --source pdfs/schemes/ --index-type hnsw --rebuild
+
+A manifest is a text file with one PDF path per line, relative to the
+manifest; blank lines and lines starting with # are ignored. PDFs are
+recorded by their path relative to the source directory (or the manifest's
+directory), so the same corpus is recognised from any working directory. A
+PDF that cannot be read or parsed is reported and skipped; a previously
+indexed version of it stays in the store until it parses again.
+"""
+import argparse
+import hashlib
+import json
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules import resources, vector_stores
+from modules.faiss_indexes import INDEX_TYPES, build_vector_store, index_vectors
+
+SOURCES_FILE = "sources.json"
+MAX_RETRIES = 5
+RETRY_BACKOFF = 2.0
+
+
+def list_sources(source):
+    """Return the PDF paths of a directory (recursively) or a manifest file."""
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(".pdf")
+        )
+    base = os.path.dirname(source)
+    with open(source, encoding="utf-8") as manifest:
+        lines = [line.strip() for line in manifest]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+
+def source_root(source):
+    """Directory that PDF paths are recorded relative to: the source directory or the manifest's."""
+    return source if os.path.isdir(source) else os.path.dirname(source) or "."
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as pdf:
+        for block in iter(lambda: pdf.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_pdf(path, chunk_size=1000, chunk_overlap=200):
+    """Load a PDF (one Document per page) and split it; returns (text, metadata) pairs."""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return [(chunk.page_content, chunk.metadata) for chunk in splitter.split_documents(PyPDFLoader(path).load())]
+
+
+def _hash_or_none(path):
+    try:
+        return file_hash(path)
+    except OSError as error:
+        print(f"Skipping {path}: {error}")
+        return None
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most requests_per_minute start per minute (None: no limit)."""
+
+    def __init__(self, requests_per_minute=None):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+def embed_chunks(embeddings, texts, batch_size=64, concurrency=4, requests_per_minute=None):
+    """
+    Embed texts in concurrent batches, keeping their order.
+
+    Args:
+        embeddings (Embeddings): Client to call; must be safe to share between threads.
+        texts (list): Texts to embed.
+        batch_size (int): Texts per embed_documents() call.
+        concurrency (int): Calls in flight at once.
+        requests_per_minute (int): Optional API quota to stay under.
+    """
+    limiter = RateLimiter(requests_per_minute)
+
+    def _embed(batch):
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.wait()
+            try:
+                return embeddings.embed_documents(batch)
+            except Exception as error:  # quota and transient API errors look alike across clients
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt
+                print(f"Embedding batch failed ({error}); retrying in {delay:.0f}s")
+                time.sleep(delay)
+
+    batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return [vector for vectors in pool.map(_embed, batches) for vector in vectors]
+
+
+def read_sources(store_dir):
+    """Return the sources.json of the current version of a store, or None if there is none."""
+    try:
+        with open(os.path.join(vector_stores.current_dir(store_dir), SOURCES_FILE), encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def publish_store(store, target, sources=None):
+    """Publish a store as the new current version of target; returns the version."""
+    def _write(path):
+        vector_stores.save_store(store, path)
+        if sources is not None:
+            with open(os.path.join(path, SOURCES_FILE), "w", encoding="utf-8") as handle:
+                json.dump(sources, handle, indent=1)
+
+    return vector_stores.publish(target, _write)
+
+
+def build_store(
+    name,
+    source,
+    backend=resources.EMBEDDING_BACKEND,
+    index_type="flat",
+    index_params=None,
+    workers=None,
+    batch_size=64,
+    concurrency=4,
+    requests_per_minute=None,
+    chunk_size=1000,
+    chunk_overlap=200,
+    rebuild=False,
+):
+    """
+    Build the store `name` from the PDFs in source, or update it in place.
+
+    Only new and changed PDFs are parsed and embedded. Flat stores are
+    updated by deleting and adding vectors; IVF and HNSW stores are rebuilt
+    from the kept chunks plus the new ones, with the kept vectors read back
+    from the current index instead of being embedded again. A store without
+    sources.json, or built with another index type, is rebuilt from scratch.
+    A build that would leave the store without any chunks is not published.
+
+    Returns:
+        str: Directory of the store.
+    """
+    started = time.perf_counter()
+    target = resources.index_path(name, backend)
+    embeddings = resources.build_embeddings(backend)
+
+    root = source_root(source)
+    files = {os.path.relpath(path, root): path for path in list_sources(source)}
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        hashes = dict(zip(files, pool.map(_hash_or_none, files.values())))
+    unreadable = {path for path, digest in hashes.items() if digest is None}
+
+    sources = None if rebuild else read_sources(target)
+    if sources is not None and sources.get("index_type") != index_type:
+        print(f"{name}: index type changed from {sources.get('index_type')} to {index_type}; rebuilding")
+        sources = None
+    known = sources["documents"] if sources else {}
+    # Stores built before paths were recorded relative to the source used cwd-relative paths
+    legacy = {os.path.relpath(path): key for key, path in files.items()}
+    known = {path if path in files else legacy.get(path, path): entry for path, entry in known.items()}
+    changed = [path for path in files if path not in unreadable and known.get(path, {}).get("sha256") != hashes[path]]
+    removed = [path for path in known if path not in files]
+    if sources is not None and not changed and not removed:
+        print(f"{name}: {len(files)} PDFs unchanged, nothing to do")
+        return target
+
+    # Parse the new and changed PDFs in parallel; one bad PDF doesn't stop the build
+    parsed = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {path: pool.submit(parse_pdf, files[path], chunk_size, chunk_overlap) for path in changed}
+        for path, future in futures.items():
+            try:
+                parsed[path] = future.result()
+            except Exception as error:
+                print(f"Skipping {files[path]}: {type(error).__name__}: {error}")
+    if sources is not None and not parsed and not removed:
+        print(f"{name}: nothing new could be parsed, store left unchanged")
+        return target
+    new_texts, new_metadatas, new_ids = [], [], []
+    # Unreadable and unparsable PDFs keep their previous chunks, if they had any
+    documents = {path: entry for path, entry in known.items() if path in files and path not in parsed}
+    for path, chunks in parsed.items():
+        ids = [f"{hashes[path][:16]}-{number}" for number in range(len(chunks))]
+        documents[path] = {"sha256": hashes[path], "ids": ids}
+        new_ids.extend(ids)
+        for text, metadata in chunks:
+            new_texts.append(text)
+            new_metadatas.append({**metadata, "source": path})
+    stale_ids = [chunk_id for path in list(parsed) + removed for chunk_id in known.get(path, {}).get("ids", [])]
+    if not any(entry["ids"] for entry in documents.values()):
+        print(f"{name}: no chunks to index from {source}; store left unchanged")
+        return target
+    new_vectors = embed_chunks(embeddings, new_texts, batch_size, concurrency, requests_per_minute)
 
-# Set your Google API key as environment variable
-# export GOOGLE_API_KEY="your-google-api-key"
-# or set it in Python:
-# os.environ["GOOGLE_API_KEY"] = "your-google-api-key"
+    if sources is not None:
+        store = vector_stores.load_store(vector_stores.current_dir(target), embeddings, mmap=False)
+    if sources is not None and index_type == "flat":
+        # Flat indexes renumber on removal, which the LangChain store expects
+        if stale_ids:
+            store.delete(stale_ids)
+        if new_texts:
+            store.add_embeddings(list(zip(new_texts, new_vectors)), new_metadatas, ids=new_ids)
+    else:
+        kept_ids = [chunk_id for path, entry in documents.items() if path not in parsed for chunk_id in entry["ids"]]
+        kept = [store.docstore.search(chunk_id) for chunk_id in kept_ids] if sources is not None else []
+        kept_vectors = []
+        if kept:
+            positions = {doc_id: position for position, doc_id in store.index_to_docstore_id.items()}
+            kept_vectors = index_vectors(store.index)[[positions[chunk_id] for chunk_id in kept_ids]].tolist()
+        store = build_vector_store(
+            [doc.page_content for doc in kept] + new_texts,
+            kept_vectors + new_vectors,
+            embeddings,
+            metadatas=[doc.metadata for doc in kept] + new_metadatas,
+            ids=kept_ids + new_ids,
+            index_type=index_type,
+            **(index_params or {}),
+        )
 
-# 1. Load PDF documents (one Document per page)
-file_path = "your_file.pdf"  # Replace with your PDF file path
-loader = PyPDFLoader(file_path)
-documents = loader.load()
+    version = publish_store(store, target, {"index_type": index_type, "documents": documents})
+    print(
+        f"{name}: {len(parsed)} PDFs parsed, {len(changed) - len(parsed) + len(unreadable)} skipped, {len(removed)} removed, {len(new_texts)} chunks added, "
+        f"{len(stale_ids)} dropped, {store.index.ntotal} in store; {time.perf_counter() - started:.1f}s "
+        f"-> {target} (version {version})"
+    )
+    return target
 
-# 2. Split documents into smaller chunks for better embedding granularity
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-split_docs = text_splitter.split_documents(documents)
 
-# 3. Initialize Google Generative AI Embeddings
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+def main():
+    parser = argparse.ArgumentParser(description="Build or update a FAISS store from PDFs.")
+    parser.add_argument("--name", required=True, help='Store name, e.g. "Schemes" or "Smart Farming"')
+    parser.add_argument("--source", required=True, help="Directory of PDFs or a manifest file")
+    parser.add_argument("--backend", default=resources.EMBEDDING_BACKEND, help="Embedding backend (google or local)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--nlist", type=int, help="IVF clusters")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ sub-vectors")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW links per node")
+    parser.add_argument("--workers", type=int, default=None, help="PDF parsing processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument("--requests-per-minute", type=int, default=None, help="Embedding API quota")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--rebuild", action="store_true", help="Ignore sources.json and rebuild everything")
+    args = parser.parse_args()
 
-# 4. Create a FAISS vector store from the split documents and embeddings
-vector_store = FAISS.from_documents(split_docs, embeddings)
+    index_params = {"nlist": args.nlist, "m": args.pq_m, "hnsw_m": args.hnsw_m}
+    build_store(
+        args.name,
+        args.source,
+        backend=args.backend,
+        index_type=args.index_type,
+        index_params={key: value for key, value in index_params.items() if value is not None},
+        workers=args.workers,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        rebuild=args.rebuild,
+    )
 
-# Save the FAISS index locally for later use
-vector_store.save_local("faiss_index")
 
-# To load the index later:
-# vector_store = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,11 @@
-from keras.models import load_model  # TensorFlow is required for Keras to work
 from PIL import Image, ImageOps  # Install pillow instead of PIL
 import numpy as np
 import random
-import requests
+from modules import resources, tracing
 
-# Load the model and class labels
+# The Keras model is loaded once per process by the shared resource registry
+# (see modules/resources.py), not at import time.
 # model = load_model(r"assets/new-model-with-wheat/keras_model.h5", compile=False)
-# Define the raw URL to download the model
-model_url = "https://github.com/nurturingagriculture/agri-app/raw/main/modules/keras_model.h5"
-model_path = "keras_model.h5"
-
-# Download the model if it doesn't exist
-if not os.path.exists(model_path):
-    response = requests.get(model_url)
-    with open(model_path, "wb") as file:
-        file.write(response.content)
-
-# Load the model
-model = load_model(model_path, compile=False)
 class_names = open(r"assets/new-model-with-wheat/labels.txt", "r").readlines()
 
 # Define remedy pairs: (remedy in English, remedy translation in Marathi)
@@ -60,36 +48,165 @@ remedy_pairs = [
     )
 ]
 
-def preprocess_image(image):
-    """Preprocess the input image to the format required by the model."""
-    size = (224, 224)
+IMAGE_SIZE = (224, 224)
+
+# Resampling filters selectable for batch paths, from most accurate to fastest.
+# LANCZOS is what the model was validated with; see compare_resampling().
+RESAMPLING_FILTERS = {
+    "lanczos": Image.Resampling.LANCZOS,
+    "bicubic": Image.Resampling.BICUBIC,
+    "bilinear": Image.Resampling.BILINEAR,
+    "box": Image.Resampling.BOX,
+    "nearest": Image.Resampling.NEAREST,
+}
+
+def fit_image(image, resample="lanczos", draft=True):
+    """
+    Decode, crop and resize an image to the model input size.
+
+    For JPEGs much larger than the target, the decoder is asked for a reduced
+    size first (draft mode), so a 12 MP photo is decoded at 1/2, 1/4 or 1/8
+    scale instead of full resolution. The draft keeps at least twice the
+    target size, leaving the resampling filter enough pixels to work with.
+
+    Args:
+        image (PIL.Image): Image as returned by Image.open(), ideally not yet loaded.
+        resample (str): Key of RESAMPLING_FILTERS.
+        draft (bool): Allow reduced-size JPEG decoding.
+
+    Returns:
+        np.ndarray: uint8 array of shape (224, 224, 3).
+    """
+    draft_size = (IMAGE_SIZE[0] * 2, IMAGE_SIZE[1] * 2)
+    if draft and image.format == "JPEG" and image.width >= draft_size[0] * 2 and image.height >= draft_size[1] * 2:
+        image.draft("RGB", draft_size)
     # Convert image to RGB to handle images with an alpha channel (e.g. RGBA)
     image = image.convert("RGB")
-    image = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
-    image_array = np.asarray(image)
-    normalized_image_array = (image_array.astype(np.float32) / 127.5) - 1  # Normalize between -1 and 1
-    data = np.ndarray(shape=(1, 224, 224, 3), dtype=np.float32)
-    data[0] = normalized_image_array
-    return data
+    image = ImageOps.fit(image, IMAGE_SIZE, RESAMPLING_FILTERS[resample])
+    return np.asarray(image)
 
-def predict_crop_disease(image):
+def normalize_into(pixels, out):
+    """Scale uint8 pixels to [-1, 1] directly into a float32 buffer of the same shape."""
+    np.divide(pixels, np.float32(127.5), out=out, casting="unsafe")
+    np.subtract(out, np.float32(1), out=out)
+    return out
+
+def preprocess_image(image, resample="lanczos", out=None):
     """
-    Predict the disease of the given crop image.
-    
+    Preprocess the input image to the format required by the model.
+
+    Args:
+        image (PIL.Image): The crop image.
+        resample (str): Key of RESAMPLING_FILTERS.
+        out (np.ndarray): Optional float32 buffer of shape (1, 224, 224, 3) to
+            fill instead of allocating a new one.
+
+    Returns:
+        np.ndarray: Normalized batch of one, shape (1, 224, 224, 3).
+    """
+    if out is None:
+        out = np.empty((1,) + IMAGE_SIZE + (3,), dtype=np.float32)
+    normalize_into(fit_image(image, resample), out[0])
+    return out
+
+def preprocess_batch(images, out, resample="lanczos"):
+    """
+    Preprocess several images into a preallocated, reusable batch buffer.
+
+    Args:
+        images (list): PIL images.
+        out (np.ndarray): float32 buffer of shape (N, 224, 224, 3) with N >= len(images).
+        resample (str): Key of RESAMPLING_FILTERS.
+
+    Returns:
+        np.ndarray: View of the filled rows, out[:len(images)].
+    """
+    for i, image in enumerate(images):
+        normalize_into(fit_image(image, resample), out[i])
+    return out[:len(images)]
+
+def compare_resampling(sources, filters=None, model=None):
+    """
+    Measure speed and fidelity of the fast paths against the original
+    full-resolution LANCZOS preprocessing.
+
+    Args:
+        sources (list): Image file paths or encoded image bytes to test on.
+        filters (list): Keys of RESAMPLING_FILTERS (default: all of them).
+        model: Optional model; if given, also report top-1 agreement with
+            predictions made on LANCZOS-preprocessed input.
+
+    Returns:
+        dict: Per filter, "seconds_per_image", "mean_abs_error" (in normalized
+              pixel units) and, with a model, "top1_agreement".
+    """
+    import io
+    import time
+
+    def _open(source):
+        return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+    filters = filters or list(RESAMPLING_FILTERS)
+    # Reference pass; unreadable images are left out of the comparison
+    readable, reference_pixels = [], []
+    for source in sources:
+        try:
+            with _open(source) as image:
+                reference_pixels.append(fit_image(image, "lanczos", draft=False))
+            readable.append(source)
+        except OSError:
+            continue
+    reference = np.empty((len(readable),) + IMAGE_SIZE + (3,), dtype=np.float32)
+    candidate = np.empty_like(reference)
+    for i, pixels in enumerate(reference_pixels):
+        normalize_into(pixels, reference[i])
+    reference_top1 = np.argmax(model.predict(reference, verbose=0), axis=1) if model is not None else None
+
+    report = {}
+    for name in filters:
+        started = time.perf_counter()
+        for i, source in enumerate(readable):
+            with _open(source) as image:
+                normalize_into(fit_image(image, name), candidate[i])
+        elapsed = time.perf_counter() - started
+        report[name] = {
+            "seconds_per_image": elapsed / max(len(readable), 1),
+            "mean_abs_error": float(np.abs(candidate - reference).mean()),
+        }
+        if model is not None:
+            top1 = np.argmax(model.predict(candidate, verbose=0), axis=1)
+            report[name]["top1_agreement"] = float((top1 == reference_top1).mean())
+    return report
+
+def top_k_classes(scores, k=3):
+    """
+    Return the k most likely classes for one row of model output.
+
+    Args:
+        scores (np.ndarray): Class probabilities for a single image.
+        k (int): Number of classes to return.
+
+    Returns:
+        list: (label, score) tuples ordered from most to least likely.
+    """
+    k = min(k, len(scores))
+    top = np.argpartition(scores, -k)[-k:]
+    top = top[np.argsort(scores[top])[::-1]]
+    return [(class_names[i].strip(), float(scores[i])) for i in top]
+
+def interpret_prediction(scores):
+    """
+    Turn one row of model output into the result dict returned by predict_crop_disease().
+
     Parameters:
-        image (PIL.Image): The crop image to analyze.
-    
+        scores (np.ndarray): Class probabilities for a single image.
+
     Returns:
         dict: Contains the predicted disease, confidence score, alternative predictions,
               and treatment recommendations if applicable.
     """
-    # Preprocess the image
-    data = preprocess_image(image)
-
-    # Make a prediction
-    prediction = model.predict(data)
-    index = np.argmax(prediction)
-    confidence_score = prediction[0][index]
+    index = np.argmax(scores)
+    confidence_score = scores[index]
     
     # Prepare the result
     result = {
@@ -99,7 +216,7 @@ def predict_crop_disease(image):
     }
     
     # Find alternative predictions with lower confidence
-    for i, score in enumerate(prediction[0]):
+    for i, score in enumerate(scores):
         if i != index and score > 0.1:  # Only include alternatives with confidence > 10%
             result["alternatives"].append({"disease": class_names[i].strip(), "confidence": score})
     
@@ -115,3 +232,24 @@ def predict_crop_disease(image):
         result["remedy_translation"] = remedy_translation
     
     return result
+
+def predict_crop_disease(image):
+    """
+    Predict the disease of the given crop image.
+    
+    Parameters:
+        image (PIL.Image): The crop image to analyze.
+    
+    Returns:
+        dict: Contains the predicted disease, confidence score, alternative predictions,
+              and treatment recommendations if applicable.
+    """
+    with tracing.trace("crop_disease"):
+        # Preprocess the image
+        with tracing.span("preprocess"):
+            data = preprocess_image(image)
+
+        # Make a prediction; concurrent uploads share one batched forward pass
+        with tracing.span("inference"):
+            prediction = resources.get("crop_queue").predict(data)
+        return interpret_prediction(prediction[0])
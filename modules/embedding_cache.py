@@ -0,0 +1,113 @@
+"""
+Content-addressed, on-disk cache of embedding vectors.
+
+Vectors are stored as raw float32 blobs in SQLite under
+sha256(model name, query/document, text), so the same text is never sent to
+the embedding API twice, whether it comes from a chat query or from an
+index rebuild in create_vector_db.py.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from modules import metrics
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "./assets/embedding_cache.sqlite")
+
+
+def cache_key(model_name, kind, text):
+    """Return the cache key for a text; kind is "query" or "document"."""
+    return hashlib.sha256(f"{model_name}\0{kind}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """SQLite-backed key -> float32 vector store with batch get/put, safe to share between threads."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB)")
+
+    def get_many(self, keys):
+        """Return a dict of key -> np.ndarray for the keys that are cached."""
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs."""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap a LangChain embeddings client with an EmbeddingStore.
+
+    Only texts missing from the store are sent to the wrapped client, in one
+    batch call per embed_documents().
+
+    Args:
+        base (Embeddings): The real embeddings client.
+        model_name (str): Part of the cache key; change it whenever the model changes.
+        store (EmbeddingStore): Where vectors are kept.
+    """
+
+    def __init__(self, base, model_name, store=None):
+        self.base = base
+        self.model_name = model_name
+        self.store = store or EmbeddingStore()
+        self.hits = metrics.counter("embedding_cache_hits_total")
+        self.misses = metrics.counter("embedding_cache_misses_total")
+
+    def _embed(self, texts, kind, embed_missing):
+        keys = [cache_key(self.model_name, kind, text) for text in texts]
+        found = self.store.get_many(keys)
+        missing = {}  # key -> text, each distinct text embedded once
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits.inc(len(texts) - len(missing))
+        self.misses.inc(len(missing))
+        if missing:
+            vectors = embed_missing(list(missing.values()))
+            new_items = list(zip(missing, vectors))
+            self.store.put_many(new_items)
+            for key, vector in new_items:
+                found[key] = np.asarray(vector, dtype=np.float32)
+        return [found[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), "document", self.base.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "query", lambda texts: [self.base.embed_query(texts[0])])[0]
+
+    def stats(self):
+        """Return hit / miss counts and the hit rate since the process started."""
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
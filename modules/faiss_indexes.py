@@ -0,0 +1,217 @@
+"""
+FAISS index types beyond the exact flat index, with recall/latency tuning.
+
+  flat      exact search (what FAISS.from_documents builds)
+  ivf-flat  inverted lists; search visits nprobe of nlist clusters
+  ivf-pq    inverted lists with product-quantized vectors (m sub-vectors of
+            nbits each); smallest memory footprint
+  hnsw      graph index; M links per node, efSearch candidates per query
+
+All indexes use L2 distance, like the LangChain FAISS default, so the
+retrievers in ai_bot and schemes work unchanged. Search-time parameters are
+set once per loaded store with configure_search() (FAISS_NPROBE and
+FAISS_EF_SEARCH in the app).
+
+Usage:
+    python -m modules.faiss_indexes --store Schemes
+    python -m modules.faiss_indexes --synthetic 200000 --dim 768 --nlist 1024 --nprobe 1 8 32 --ef-search 16 64
+"""
+import argparse
+import math
+import time
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf-flat", "ivf-pq", "hnsw")
+
+
+def build_index(vectors, index_type="flat", nlist=None, m=None, nbits=8, hnsw_m=32, ef_construction=80):
+    """
+    Build and fill a FAISS index.
+
+    Args:
+        vectors (np.ndarray): float32 array of shape (n, d).
+        index_type (str): One of INDEX_TYPES.
+        nlist (int): IVF clusters (default: about 4 * sqrt(n), at least 39 training points each).
+        m (int): PQ sub-vectors; must divide d (default: largest of 64, 48, 32, ... that does).
+        nbits (int): Bits per PQ code (lowered automatically for tiny corpora).
+        hnsw_m (int): HNSW links per node.
+        ef_construction (int): HNSW build-time candidate list size.
+
+    Returns:
+        faiss.Index
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type in ("ivf-flat", "ivf-pq"):
+        nlist = nlist or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatL2(d)
+        if index_type == "ivf-flat":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist)
+        else:
+            m = m or next(candidate for candidate in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1) if d % candidate == 0)
+            while nbits > 1 and 2 ** nbits > n:
+                nbits -= 1
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, m, nbits)
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    index.add(vectors)
+    return index
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Set search-time parameters on an index; parameters that don't apply are ignored."""
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = int(nprobe)
+        except RuntimeError:
+            pass  # not an IVF index
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(ef_search)
+    return index
+
+
+def index_vectors(index):
+    """
+    Return every vector held by an index, in position order.
+
+    Exact for flat, IVF-flat and HNSW indexes; IVF-PQ indexes only keep
+    quantized codes, so their vectors are the PQ approximations.
+    """
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass  # not an IVF index; reconstruct works without a direct map
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def build_vector_store(texts, vectors, embeddings, metadatas=None, ids=None, index_type="flat", **index_params):
+    """
+    Create a LangChain FAISS store around an index of the requested type.
+
+    Args:
+        texts (list): Chunk texts.
+        vectors (list): Their embeddings, in the same order.
+        embeddings (Embeddings): Used by the store to embed queries.
+        metadatas (list): Optional metadata dict per chunk.
+        ids (list): Optional docstore id per chunk (default: random UUIDs).
+        index_type (str): One of INDEX_TYPES.
+        **index_params: Passed to build_index().
+    """
+    import uuid
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+    index = build_index(np.asarray(vectors, dtype=np.float32), index_type, **index_params)
+    metadatas = metadatas or [{} for _ in texts]
+    ids = ids or [str(uuid.uuid4()) for _ in texts]
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=text, metadata=metadata)
+        for doc_id, text, metadata in zip(ids, texts, metadatas)
+    })
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def index_bytes(index):
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return faiss.serialize_index(index).nbytes
+
+
+def benchmark(vectors, queries, configs, k=4):
+    """
+    Measure recall@k against exact search, QPS and memory per configuration.
+
+    Args:
+        vectors (np.ndarray): Corpus vectors, shape (n, d).
+        queries (np.ndarray): Query vectors, shape (q, d).
+        configs (list): (index_type, build params, search params) tuples.
+        k (int): Neighbours per query.
+
+    Returns:
+        list: One dict per configuration.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    _, truth = build_index(vectors, "flat").search(queries, k)
+
+    results = []
+    built = {}
+    for index_type, build_params, search_params in configs:
+        build_key = (index_type, tuple(sorted(build_params.items())))
+        if build_key not in built:
+            started = time.perf_counter()
+            built[build_key] = (build_index(vectors, index_type, **build_params), time.perf_counter() - started)
+        index, build_seconds = built[build_key]
+        configure_search(index, **search_params)
+
+        started = time.perf_counter()
+        _, found = index.search(queries, k)
+        elapsed = time.perf_counter() - started
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        results.append({
+            "index_type": index_type,
+            "params": {**build_params, **search_params},
+            "recall_at_k": float(recall),
+            "qps": len(queries) / elapsed if elapsed else float("inf"),
+            "memory_mb": index_bytes(index) / 2**20,
+            "build_seconds": build_seconds,
+        })
+    return results
+
+
+def _store_vectors(store_name):
+    from modules import resources, vector_stores
+    index = faiss.read_index(f"{vector_stores.current_dir(resources.index_path(store_name))}/index.faiss")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against exact search.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--store", help="Benchmark on the vectors of an existing store, e.g. Schemes")
+    source.add_argument("--synthetic", type=int, help="Benchmark on N random vectors")
+    parser.add_argument("--dim", type=int, default=768, help="Dimension for --synthetic")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--pq-m", type=int, default=None)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        vectors = _store_vectors(args.store)
+    else:
+        vectors = rng.standard_normal((args.synthetic, args.dim), dtype=np.float32)
+    # Queries near corpus points, like real questions near their answer chunks
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = vectors[picks] + rng.normal(0, vectors.std() * 0.3, (args.queries, vectors.shape[1])).astype(np.float32)
+
+    configs = [("flat", {}, {})]
+    configs += [("ivf-flat", {"nlist": args.nlist}, {"nprobe": p}) for p in args.nprobe]
+    configs += [("ivf-pq", {"nlist": args.nlist, "m": args.pq_m}, {"nprobe": p}) for p in args.nprobe]
+    configs += [("hnsw", {"hnsw_m": args.hnsw_m}, {"ef_search": ef}) for ef in args.ef_search]
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10} {'params':<34} {'recall@k':>9} {'QPS':>10} {'MB':>8} {'build s':>8}")
+    for row in benchmark(vectors, queries, configs, k=args.k):
+        params = ", ".join(f"{key}={value}" for key, value in row["params"].items() if value is not None)
+        print(f"{row['index_type']:<10} {params:<34} {row['recall_at_k']:>9.3f} {row['qps']:>10.0f} "
+              f"{row['memory_mb']:>8.1f} {row['build_seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
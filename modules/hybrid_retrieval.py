@@ -0,0 +1,201 @@
+"""
+Hybrid keyword + vector retrieval for the chatbots.
+
+Dense retrieval alone often misses chunks that name a scheme exactly
+("PMFBY", "KCC", "Namo Shetkari Mahasanman Nidhi"). HybridRetriever keeps an
+in-memory BM25 index over the same chunks as a FAISS store, fuses the BM25
+and FAISS rankings with reciprocal rank fusion, optionally reranks the best
+candidates within a time budget, and only then reads the final top-k chunks
+from the docstore.
+
+Configuration (environment):
+  RETRIEVAL_K          chunks sent to the LLM (default 3)
+  RETRIEVAL_FETCH_K    candidates taken from each ranking (default 20)
+  RERANKER             "keyword" (default) or "none"
+  RERANK_BUDGET_MS     time budget for reranking (default 30)
+"""
+import math
+import os
+import re
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from modules import tracing
+
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", "3"))
+RETRIEVAL_FETCH_K = int(os.environ.get("RETRIEVAL_FETCH_K", "20"))
+RERANKER = os.environ.get("RERANKER", "keyword")
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "30"))
+RRF_K = 60  # standard reciprocal rank fusion constant
+
+# Word characters plus Devanagari vowel signs, which \w does not cover; the
+# danda and double danda (U+0964, U+0965) end sentences and are left out
+_TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u097f]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of texts, with per-term weights precomputed.
+
+    Args:
+        texts (list): Chunk texts; results refer to their positions.
+        k1 (float): Term frequency saturation.
+        b (float): Length normalization.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        entries = defaultdict(list)
+        lengths = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                entries[term].append((position, frequency))
+
+        self.size = len(texts)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if self.size else 0.0, 1.0))
+        self.idf = {}
+        self._postings = {}  # term -> (positions, BM25 weights)
+        for term, postings in entries.items():
+            positions = np.fromiter((position for position, _ in postings), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter((frequency for _, frequency in postings), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (self.size - len(postings) + 0.5) / (len(postings) + 0.5))
+            self.idf[term] = idf
+            self._postings[term] = (positions, idf * frequencies * (k1 + 1) / (frequencies + norm[positions]))
+
+    def search(self, query, k):
+        """Return up to k (position, score) pairs with a non-zero score, best first."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term in self._postings:
+                positions, weights = self._postings[term]
+                scores[positions] += weights
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(position), float(scores[position])) for position in candidates]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse lists of positions (best first) into one list of (position, score), best first."""
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            fused[position] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def keyword_rerank(query, candidates, bm25, deadline):
+    """
+    Reorder candidates by how much of the query they contain.
+
+    Each candidate's fused score gets a boost for the share of the query's
+    IDF mass it covers and for the share of the query's consecutive word
+    pairs it contains verbatim, which is what exact scheme names look like.
+    Candidates are scored in fused order until the deadline
+    (time.perf_counter()); any left over keep their fused score.
+
+    Args:
+        query (str): The user's question.
+        candidates (list): (position, fused score, text) tuples, best first.
+        bm25 (BM25Index): Supplies the IDF weights.
+        deadline (float): Time by which reranking must stop.
+    """
+    terms = set(tokenize(query))
+    total_idf = sum(bm25.idf.get(term, 0.0) for term in terms) or 1.0
+    query_words = tokenize(query)
+    phrases = {" ".join(query_words[start:start + 2]) for start in range(len(query_words) - 1)}
+    # Scale boosts to the fused scores, so a boost can reorder but not swamp the fusion
+    scale = candidates[0][1] if candidates else 0.0
+
+    reranked = []
+    for number, (position, fused, text) in enumerate(candidates):
+        if time.perf_counter() > deadline:
+            reranked.extend(candidates[number:])
+            break
+        words = tokenize(text)
+        present = set(words)
+        coverage = sum(bm25.idf.get(term, 0.0) for term in terms & present) / total_idf
+        joined = f" {' '.join(words)} "
+        phrase_hits = sum(1 for phrase in phrases if f" {phrase} " in joined) / len(phrases) if phrases else 0.0
+        reranked.append((position, fused + scale * (coverage + phrase_hits), text))
+    return sorted(reranked, key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """
+    BM25 + FAISS retrieval over one version of a store.
+
+    Args:
+        store: LangChain FAISS store (in-memory or the memory-mapped kind from vector_stores).
+        k (int): Chunks returned per query.
+        fetch_k (int): Candidates taken from each ranking before fusion.
+        reranker (str): "keyword" or "none".
+        rerank_budget_ms (float): Time budget for reranking.
+    """
+
+    def __init__(self, store, k=RETRIEVAL_K, fetch_k=RETRIEVAL_FETCH_K, reranker=RERANKER,
+                 rerank_budget_ms=RERANK_BUDGET_MS):
+        self.vectorstore = store
+        self.embeddings = store.embeddings
+        self.k = k
+        self.fetch_k = fetch_k
+        self.reranker = reranker
+        self.rerank_budget_ms = rerank_budget_ms
+        started = time.perf_counter()
+        if hasattr(store.docstore, "documents"):
+            # SQLite docstore: every chunk in one query instead of one per chunk
+            documents = store.docstore.documents()
+            self._ids = [document.id for document in documents]
+            texts = [document.page_content for document in documents]
+        else:
+            self._ids = [store.index_to_docstore_id[position] for position in range(store.index.ntotal)]
+            texts = [self._document(position).page_content for position in range(len(self._ids))]
+        self.bm25 = BM25Index(texts)
+        print(f"BM25 index over {len(self._ids)} chunks built in {time.perf_counter() - started:.2f}s")
+
+    def _document(self, position):
+        return self.vectorstore.docstore.search(self._ids[position])
+
+    def retrieve(self, query, query_vector=None, k=None):
+        """
+        Return the top-k Documents for a query.
+
+        Args:
+            query (str): The user's question.
+            query_vector (list): Its embedding; computed if not given.
+            k (int): Overrides the number of chunks returned.
+        """
+        k = k or self.k
+        if not self._ids:
+            return []
+        started = time.perf_counter()
+        if query_vector is None:
+            with tracing.span("embedding"):
+                query_vector = self.embeddings.embed_query(query)
+        vector = np.asarray([query_vector], dtype=np.float32)
+        with tracing.span("vector_search"):
+            _, dense = self.vectorstore.index.search(vector, min(self.fetch_k, len(self._ids)))
+        dense_ranking = [int(position) for position in dense[0] if position >= 0]
+        with tracing.span("keyword_search"):
+            keyword_ranking = [position for position, _ in self.bm25.search(query, self.fetch_k)]
+        fused = reciprocal_rank_fusion([dense_ranking, keyword_ranking])
+
+        if self.reranker != "keyword" or not fused:
+            return [self._document(position) for position, _ in fused[:k]]
+
+        # Rerank a short list only; its chunks are the only ones read from the docstore
+        with tracing.span("rerank"):
+            documents = {position: self._document(position) for position, _ in fused[:k * 3]}
+            shortlist = [(position, score, documents[position].page_content) for position, score in fused[:k * 3]]
+            deadline = started + self.rerank_budget_ms / 1000
+            reranked = keyword_rerank(query, shortlist, self.bm25, deadline)
+        return [documents[position] for position, _, _ in reranked[:k]]
@@ -0,0 +1,255 @@
+"""
+Pluggable runtimes for the crop disease classifier.
+
+The Keras backend needs the whole TensorFlow stack. The model can instead be
+exported once to TFLite (optionally float16 or int8 quantized) or ONNX and
+served through tflite_runtime / onnxruntime, which start faster and use far
+less memory per worker. Every backend exposes the same predict() call as a
+Keras model, so the rest of the app does not care which one is active.
+
+Select the runtime with CROP_MODEL_BACKEND (keras, tflite or onnx) and,
+optionally, the model file with CROP_MODEL_PATH. The tflite backend needs
+tflite_runtime (or TensorFlow) and the onnx backend onnxruntime; neither is
+in the default requirements.
+
+Usage:
+    python -m modules.inference_backends export --format tflite-int8 --calibration photos/
+    python -m modules.inference_backends parity --backend tflite --model keras_model.int8.tflite --validation photos/
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+MODEL_URL = "https://github.com/nurturingagriculture/agri-app/raw/main/modules/keras_model.h5"
+KERAS_MODEL_PATH = "keras_model.h5"
+
+EXPORT_FORMATS = {
+    "tflite": "keras_model.tflite",
+    "tflite-fp16": "keras_model.fp16.tflite",
+    "tflite-int8": "keras_model.int8.tflite",
+    "onnx": "keras_model.onnx",
+}
+
+
+def ensure_keras_model(model_path=KERAS_MODEL_PATH):
+    """Download the Keras model if it doesn't exist locally and return its path."""
+    if not os.path.exists(model_path):
+        import requests
+        response = requests.get(MODEL_URL)
+        with open(model_path, "wb") as file:
+            file.write(response.content)
+    return model_path
+
+
+class KerasBackend:
+    """The original full TensorFlow/Keras model."""
+
+    def __init__(self, model_path=KERAS_MODEL_PATH):
+        from keras.models import load_model  # TensorFlow is required for Keras to work
+        self.model = load_model(ensure_keras_model(model_path), compile=False)
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        return self.model.predict(batch, batch_size=batch_size, verbose=verbose)
+
+
+class TFLiteBackend:
+    """
+    TFLite interpreter, via tflite_runtime when installed.
+
+    An interpreter holds mutable tensors, so calls are serialized; the input
+    tensor is resized only when the batch size changes.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError as e:
+                raise ImportError(f"CROP_MODEL_BACKEND=tflite needs: pip install tflite-runtime ({e})") from e
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]["index"]
+        self._output = self.interpreter.get_output_details()[0]["index"]
+        self._batch_rows = None
+        self._lock = threading.Lock()
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if self._batch_rows != len(batch):
+                self.interpreter.resize_tensor_input(self._input, batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_rows = len(batch)
+            self.interpreter.set_tensor(self._input, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output).copy()
+
+
+class OnnxBackend:
+    """ONNX Runtime on CPU; sessions are safe to call from several threads."""
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(f"CROP_MODEL_BACKEND=onnx needs: pip install onnxruntime ({e})") from e
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0].name
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input: batch})[0]
+
+
+BACKENDS = {
+    "keras": (KerasBackend, KERAS_MODEL_PATH),
+    "tflite": (TFLiteBackend, EXPORT_FORMATS["tflite"]),
+    "onnx": (OnnxBackend, EXPORT_FORMATS["onnx"]),
+}
+
+
+def load_backend(name=None, model_path=None):
+    """
+    Build the configured backend.
+
+    Args:
+        name (str): "keras", "tflite" or "onnx" (default: $CROP_MODEL_BACKEND or "keras").
+        model_path (str): Model file (default: $CROP_MODEL_PATH or the backend's default file).
+    """
+    name = name or os.environ.get("CROP_MODEL_BACKEND", "keras")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown crop model backend: {name}")
+    backend_class, default_path = BACKENDS[name]
+    return backend_class(model_path or os.environ.get("CROP_MODEL_PATH") or default_path)
+
+
+# --------------------------------------------------------------------
+# Export and parity check
+
+def _load_folder(folder, limit=None):
+    from modules.bulk_scorer import iter_images
+    from modules.crop_disease_detector import IMAGE_SIZE, fit_image, normalize_into
+    from PIL import Image
+
+    paths = [path for _, path in iter_images(folder)][:limit]
+    batch = np.empty((len(paths),) + IMAGE_SIZE + (3,), dtype=np.float32)
+    for i, path in enumerate(paths):
+        with Image.open(path) as image:
+            normalize_into(fit_image(image, draft=False), batch[i])
+    return paths, batch
+
+
+def export_model(fmt, keras_path=KERAS_MODEL_PATH, output_path=None, calibration_folder=None):
+    """
+    Convert the Keras model to TFLite or ONNX.
+
+    Args:
+        fmt (str): One of EXPORT_FORMATS.
+        keras_path (str): Source .h5 model.
+        output_path (str): Destination (default: EXPORT_FORMATS[fmt]).
+        calibration_folder (str): Images for int8 calibration (required for tflite-int8).
+
+    Returns:
+        str: Path of the written model.
+    """
+    import tensorflow as tf
+    from keras.models import load_model
+
+    output_path = output_path or EXPORT_FORMATS[fmt]
+    model = load_model(ensure_keras_model(keras_path), compile=False)
+
+    if fmt == "onnx":
+        import tf2onnx
+        spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+        return output_path
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if fmt == "tflite-fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif fmt == "tflite-int8":
+        if not calibration_folder:
+            raise ValueError("int8 quantization needs --calibration images")
+        _, samples = _load_folder(calibration_folder, limit=200)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        # Input and output stay float32, so preprocessing is unchanged.
+        converter.representative_dataset = lambda: ([sample[None]] for sample in samples)
+    with open(output_path, "wb") as file:
+        file.write(converter.convert())
+    return output_path
+
+
+def parity_check(candidate, validation_folder, reference=None, batch_size=32):
+    """
+    Compare a backend's predictions with the Keras model over a folder of images.
+
+    Returns:
+        dict: "images", "top1_agreement", "max_abs_diff" between class
+              probabilities, and seconds per image for both backends.
+    """
+    reference = reference or KerasBackend()
+    paths, batch = _load_folder(validation_folder)
+    if not paths:
+        raise ValueError(f"No images found in {validation_folder}")
+
+    def _timed(backend):
+        started = time.perf_counter()
+        output = np.concatenate([backend.predict(batch[i:i + batch_size])
+                                 for i in range(0, len(batch), batch_size)])
+        return output, (time.perf_counter() - started) / len(batch)
+
+    expected, reference_seconds = _timed(reference)
+    actual, candidate_seconds = _timed(candidate)
+    return {
+        "images": len(paths),
+        "top1_agreement": float((expected.argmax(axis=1) == actual.argmax(axis=1)).mean()),
+        "max_abs_diff": float(np.abs(expected - actual).max()),
+        "reference_seconds_per_image": reference_seconds,
+        "candidate_seconds_per_image": candidate_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and validate crop disease model backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Convert the Keras model")
+    export.add_argument("--format", choices=list(EXPORT_FORMATS), required=True)
+    export.add_argument("--keras-model", default=KERAS_MODEL_PATH)
+    export.add_argument("--output")
+    export.add_argument("--calibration", help="Image folder for int8 calibration")
+
+    parity = commands.add_parser("parity", help="Check a backend against the Keras model")
+    parity.add_argument("--backend", choices=list(BACKENDS), required=True)
+    parity.add_argument("--model", help="Model file for the backend")
+    parity.add_argument("--validation", required=True, help="Folder of validation images")
+    parity.add_argument("--min-agreement", type=float, default=0.99,
+                        help="Exit with an error below this top-1 agreement")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        path = export_model(args.format, args.keras_model, args.output, args.calibration)
+        print(f"Model exported to {path} ({os.path.getsize(path) / 2**20:.1f} MB).")
+        return
+
+    report = parity_check(load_backend(args.backend, args.model), args.validation)
+    print(f"Images:          {report['images']}")
+    print(f"Top-1 agreement: {report['top1_agreement']:.2%}")
+    print(f"Max prob. diff:  {report['max_abs_diff']:.4f}")
+    print(f"Keras:           {report['reference_seconds_per_image'] * 1000:.1f} ms/image")
+    print(f"{args.backend + ':':<17}{report['candidate_seconds_per_image'] * 1000:.1f} ms/image")
+    if report["top1_agreement"] < args.min_agreement:
+        raise SystemExit("Parity check failed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Crop disease prediction for the UI, local or through the inference service.
+
+With CROP_INFERENCE_URL set (e.g. http://127.0.0.1:8600), predict_crop_disease()
+sends the image to modules/inference_server.py and the Streamlit process never
+loads the model. Without it, the model runs in-process as before.
+
+Only what the model needs is sent: the image is center-cropped to a square,
+reduced to INPUT_SIZE (twice the model's input, so the server's resize works
+from the same kind of detail as the draft decode in fit_image()) and
+re-encoded as JPEG, a few tens of KB instead of a multi-MB phone photo.
+
+Configuration (environment):
+  CROP_INFERENCE_URL        base URL of the inference service; empty runs the model locally
+  CROP_INFERENCE_TIMEOUT    read timeout in seconds (default 45, above the server's own 30 s limit)
+  CROP_INFERENCE_POOL_SIZE  pooled connections to the service (default 8)
+"""
+import io
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+from modules import tracing
+
+CROP_INFERENCE_URL = os.environ.get("CROP_INFERENCE_URL", "")
+CONNECT_TIMEOUT = 2  # seconds
+# Longer than the server's REQUEST_TIMEOUT, so a slow prediction ends in its 504 rather than a client timeout
+READ_TIMEOUT = float(os.environ.get("CROP_INFERENCE_TIMEOUT", "45"))
+POOL_SIZE = int(os.environ.get("CROP_INFERENCE_POOL_SIZE", "8"))
+MAX_RETRIES = 2
+INPUT_SIZE = (448, 448)
+JPEG_QUALITY = 90
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def encode_image(image, size=INPUT_SIZE, quality=JPEG_QUALITY):
+    """Crop and shrink an image to what the model needs and return it as JPEG bytes."""
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+    image = ImageOps.fit(image.convert("RGB"), size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class InferenceClient:
+    """
+    Pooled, keep-alive HTTP client for the inference service.
+
+    Connection errors and 503 responses (loading or overloaded) are retried
+    with backoff, honouring Retry-After; other errors are raised. Read
+    timeouts are not retried: the server may still be working on the image,
+    and a retry would only add to its queue.
+
+    Args:
+        url (str): Base URL of the service.
+        timeout (tuple): (connect, read) timeouts in seconds.
+        pool_size (int): Connections kept open to the service.
+        max_retries (int): Retries per request.
+    """
+
+    def __init__(self, url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), pool_size=POOL_SIZE, max_retries=MAX_RETRIES):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            read=0,
+            backoff_factor=0.5,
+            status_forcelist=(503,),
+            allowed_methods=("GET", "POST"),  # predictions have no side effects
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount(self.url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+    def predict(self, payload):
+        """
+        Send encoded image bytes and return the result dict.
+
+        Raises:
+            requests.exceptions.RequestException: If the service can't be reached
+                or answers with an error.
+        """
+        response = self.session.post(
+            f"{self.url}/predict", data=payload, headers={"Content-Type": "image/jpeg"}, timeout=self.timeout
+        )
+        if response.status_code >= 400:
+            try:
+                message = response.json()["error"]
+            except ValueError:
+                message = response.text
+            response.reason = f"{response.reason}: {message}"
+        response.raise_for_status()
+        return response.json()
+
+    def ready(self):
+        """Return True if the service answers /readyz with 200."""
+        try:
+            return self.session.get(f"{self.url}/readyz", timeout=self.timeout).status_code == 200
+        except Exception:
+            return False
+
+
+def get_client(url=CROP_INFERENCE_URL):
+    """Return the process-wide client, shared by every session."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient(url)
+        return _client
+
+
+def predict_crop_disease(image):
+    """
+    Predict the disease of the given crop image; same result dict as crop_disease_detector.predict_crop_disease().
+
+    Parameters:
+        image (PIL.Image): The crop image to analyze.
+    """
+    if not CROP_INFERENCE_URL:
+        from modules import crop_disease_detector
+        return crop_disease_detector.predict_crop_disease(image)
+
+    with tracing.trace("crop_disease"):
+        with tracing.span("encode"):
+            payload = encode_image(image)
+        with tracing.span("remote_inference"):
+            return get_client().predict(payload)
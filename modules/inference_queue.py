@@ -0,0 +1,102 @@
+"""
+Micro-batching front end for the crop disease model.
+
+Concurrent callers submit preprocessed tensors; a single worker thread groups
+whatever arrives within a short window (or until the batch is full), runs one
+forward pass, and hands each caller back its own slice of the output. The
+time each request waited for its batch to start is exported as
+<name>_queue_wait_seconds and set on its future as `queue_seconds`.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from modules import metrics, tracing
+
+
+class BatchingQueue:
+    """
+    Gather concurrent predict() calls into batched forward passes.
+
+    Args:
+        predict_fn (callable): Takes an array of shape (N, ...) and returns one
+            output row per input row, e.g. a Keras model's predict method.
+        max_batch_size (int): Upper bound on rows per forward pass.
+        max_wait_ms (float): How long the first request of a batch may wait for
+            others to join it.
+        name (str): Prefix for the exported latency and batch size histograms.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0, name="crop_model"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.latency = metrics.histogram(f"{name}_request_latency_seconds")
+        self.batch_size = metrics.histogram(f"{name}_batch_size", metrics.SIZE_BUCKETS)
+        self.queue_wait = metrics.histogram(f"{name}_queue_wait_seconds")
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, data):
+        """
+        Queue a batch of one or more samples for inference.
+
+        Args:
+            data (np.ndarray): Input of shape (n, ...) with n >= 1.
+
+        Returns:
+            Future: Resolves to the model output for exactly those n rows; its
+                queue_seconds attribute holds the wait before the forward pass.
+        """
+        future = Future()
+        self._queue.put((data, future, time.perf_counter()))
+        return future
+
+    def predict(self, data, timeout=None):
+        """Blocking version of submit(); drop-in replacement for model.predict()."""
+        return self.submit(data).result(timeout=timeout)
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or the window closes."""
+        batch = [self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch, rows
+
+    def _run(self):
+        while True:
+            batch, rows = self._collect()
+            self.batch_size.observe(rows)
+            started = time.perf_counter()
+            for _, future, submitted in batch:
+                future.queue_seconds = started - submitted
+                self.queue_wait.observe(future.queue_seconds)
+            try:
+                inputs = batch[0][0] if len(batch) == 1 else np.concatenate([item[0] for item in batch])
+                with tracing.span("model_predict"):
+                    outputs = self.predict_fn(inputs)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            finished = time.perf_counter()
+            for data, future, submitted in batch:
+                future.set_result(outputs[offset:offset + len(data)])
+                offset += len(data)
+                self.latency.observe(finished - submitted)
@@ -0,0 +1,248 @@
+"""
+Crop disease inference as a standalone HTTP service.
+
+Runs the model in one process of its own instead of inside every Streamlit
+worker, so the CPU- and memory-heavy inference tier is scaled separately
+from the UI. Requests are decoded and preprocessed on a pool of worker
+threads, and concurrent requests share batched forward passes through the
+same BatchingQueue the app uses (see modules/resources.py). When more
+than --max-pending requests are waiting, new ones are refused with 503 so a
+burst cannot pile up unbounded work.
+
+Endpoints:
+  POST /predict  image bytes (JPEG or PNG) in, predict_crop_disease() result as JSON out
+  GET  /healthz  200 while the process is up
+  GET  /readyz   200 once the model is loaded and warmed up, 503 before
+  GET  /metrics  Prometheus metrics (modules.metrics)
+
+Usage:
+    python -m modules.inference_server --port 8600
+    CROP_INFERENCE_URL=http://127.0.0.1:8600 streamlit run main-app.py
+"""
+import argparse
+import io
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from modules import metrics, resources
+
+MAX_IMAGE_BYTES = 10 * 2**20
+REQUEST_TIMEOUT = 30  # seconds a request may wait for its result
+
+
+class Overloaded(Exception):
+    """More requests are pending than the service accepts."""
+
+
+def to_json(result):
+    """Convert a predict_crop_disease() result (numpy scores) to plain JSON types."""
+    result = dict(result)
+    result["confidence"] = float(result["confidence"])
+    result["alternatives"] = [
+        {"disease": alternative["disease"], "confidence": float(alternative["confidence"])}
+        for alternative in result["alternatives"]
+    ]
+    return result
+
+
+def preprocess_bytes(payload):
+    """Decode encoded image bytes into the model's input tensor, shape (1, 224, 224, 3)."""
+    from PIL import Image
+    from modules.crop_disease_detector import preprocess_image
+    with Image.open(io.BytesIO(payload)) as image:
+        return preprocess_image(image)
+
+
+def _forward(prepared, result):
+    """Done callback: hand a preprocessed tensor to the batching queue without waiting on the model."""
+    if prepared.cancelled():
+        result.cancel()
+        return
+    try:
+        queued = resources.get("crop_queue").submit(prepared.result())
+    except Exception as e:
+        result.set_exception(e)
+        return
+
+    def copy(queued):
+        if queued.exception() is not None:
+            result.set_exception(queued.exception())
+        else:
+            result.set_result(queued.result())
+
+    queued.add_done_callback(copy)
+
+
+class InferenceService:
+    """
+    Worker pool and admission control in front of the shared model.
+
+    Args:
+        workers (int): Threads decoding and preprocessing images. They never
+            wait on the model, so a batch can hold up to CROP_MAX_BATCH
+            requests however few workers there are.
+        max_pending (int): Requests accepted at once, running or queued.
+    """
+
+    def __init__(self, workers=4, max_pending=64):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.ready = threading.Event()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.requests = metrics.counter("inference_requests_total")
+        self.rejected = metrics.counter("inference_rejected_total")
+        self.failures = metrics.counter("inference_errors_total")
+        self.latency = metrics.histogram("inference_request_seconds")
+
+    def load(self):
+        """Load the model and run one prediction so the first request doesn't pay for warm-up."""
+        from PIL import Image
+        started = time.perf_counter()
+        try:
+            resources.get("crop_queue")
+            buffer = io.BytesIO()
+            Image.new("RGB", (224, 224), (60, 140, 60)).save(buffer, format="JPEG")
+            resources.get("crop_queue").predict(preprocess_bytes(buffer.getvalue()))
+        except Exception as e:
+            # /readyz stays 503, so the orchestrator restarts or avoids this instance
+            print(f"Could not load the crop disease model: {e}")
+            return
+        self.ready.set()
+        print(f"Crop disease model ready in {time.perf_counter() - started:.1f}s")
+
+    def predict(self, payload, timeout=REQUEST_TIMEOUT):
+        """
+        Predict one image, waiting at most `timeout` seconds.
+
+        Raises:
+            Overloaded: If max_pending requests are already accepted.
+            concurrent.futures.TimeoutError: If the result is not ready in time.
+        """
+        if not self._pending.acquire(blocking=False):
+            self.rejected.inc()
+            raise Overloaded("Too many pending requests")
+        started = time.perf_counter()
+        self.requests.inc()
+        from modules.crop_disease_detector import interpret_prediction
+        result = Future()
+        # The pool thread only preprocesses; the model is waited on here, in the request's own thread
+        self.pool.submit(preprocess_bytes, payload).add_done_callback(lambda prepared: _forward(prepared, result))
+        # The slot is freed when the work finishes, even if the caller timed out
+        result.add_done_callback(lambda _: self._pending.release())
+        try:
+            return to_json(interpret_prediction(result.result(timeout=timeout)[0]))
+        except Exception:
+            self.failures.inc()
+            raise
+        finally:
+            self.latency.observe(time.perf_counter() - started)
+
+
+def make_handler(service, timeout=REQUEST_TIMEOUT):
+    """Build the request handler class bound to a service."""
+
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so clients can reuse pooled connections
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status, body, content_type="application/json", headers=None):
+            body = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message, headers=None):
+            self._send(status, json.dumps({"error": message}), headers=headers)
+
+        def do_GET(self):
+            path = self.path.partition("?")[0]
+            if path == "/healthz":
+                self._send(200, '{"status": "ok"}')
+            elif path == "/readyz":
+                if service.ready.is_set():
+                    self._send(200, '{"status": "ready"}')
+                else:
+                    self._error(503, "Model is loading", {"Retry-After": "5"})
+            elif path == "/metrics":
+                self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+            else:
+                self._error(404, "Not found")
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                # The body can't be delimited, so the connection can't be reused either
+                self.close_connection = True
+                self._error(400, "Invalid Content-Length")
+                return
+            if length > MAX_IMAGE_BYTES:
+                self.close_connection = True
+                self._error(413, f"Images are limited to {MAX_IMAGE_BYTES // 2**20} MB")
+                return
+            payload = self.rfile.read(length)
+            if self.path.partition("?")[0] != "/predict":
+                self._error(404, "Not found")
+                return
+            if not payload:
+                self._error(400, "Send the image bytes as the request body")
+                return
+            if not service.ready.is_set():
+                self._error(503, "Model is loading", {"Retry-After": "5"})
+                return
+            try:
+                result = service.predict(payload, timeout)
+            except Overloaded as e:
+                self._error(503, str(e), {"Retry-After": "1"})
+            except FutureTimeoutError:
+                self._error(504, "Prediction timed out")
+            except OSError as e:
+                # PIL raises UnidentifiedImageError (an OSError) for anything that isn't an image
+                self._error(400, f"Could not read the image: {e}")
+            except Exception as e:
+                self._error(500, f"{type(e).__name__}: {e}")
+            else:
+                self._send(200, json.dumps(result))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8600, workers=4, max_pending=64, timeout=REQUEST_TIMEOUT):
+    """Start the service and block; the model loads in the background while /readyz reports 503."""
+    service = InferenceService(workers, max_pending)
+    server = ThreadingHTTPServer((host, port), make_handler(service, timeout))
+    server.daemon_threads = True
+    threading.Thread(target=service.load, name="model-loader", daemon=True).start()
+    print(f"Crop disease inference service on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the crop disease model over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=4, help="Decode/preprocess threads")
+    parser.add_argument("--max-pending", type=int, default=64, help="Requests accepted at once before 503")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Seconds per request")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_pending, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+LLM gateway: one place where every chatbot request goes through limits,
+retries and failover.
+
+The gateway owns an asyncio event loop on a background thread and one
+long-lived client per provider, so HTTP connections are pooled across all
+sessions. Each request
+  - waits for the provider's token bucket (requests per minute), then for a
+    global and a per-provider concurrency slot, so requests held back by the
+    rate limit don't occupy slots others could use,
+  - is retried with jittered exponential backoff on rate limits, timeouts and
+    5xx errors until its first token arrives,
+  - fails over to the next provider once retries are exhausted, and, with
+    LLM_HEDGE_AFTER set, also starts the next provider if no token has arrived
+    after that many seconds, keeping whichever answers first.
+Once tokens are flowing a request is never switched to another provider,
+but a stream that goes quiet for longer than LLM_IDLE_TIMEOUT is failed.
+
+Streamlit code calls the synchronous stream() / invoke(); both run on the
+gateway loop.
+
+Configuration (environment):
+  LLM_PROVIDERS            comma-separated provider:model list, first is primary
+                           (default groq:llama3.1-8b-8192,groq:llama-3.3-70b-versatile,gemini:gemini-1.5-flash);
+                           "stub" is a local provider for tests
+  LLM_MAX_CONCURRENCY      requests in flight, all providers (default 32)
+  LLM_PROVIDER_CONCURRENCY requests in flight per provider (default 8)
+  LLM_REQUESTS_PER_MINUTE  token bucket rate per provider, 0 for none (default 0)
+  LLM_MAX_RETRIES          retries per provider (default 2)
+  LLM_TIMEOUT              seconds to wait for the first token (default 20)
+  LLM_IDLE_TIMEOUT         seconds to wait for each later token (default 20)
+  LLM_HEDGE_AFTER          seconds before a hedged request, 0 for none (default 0)
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+
+from modules import metrics
+
+DEFAULT_PROVIDERS = "groq:llama3.1-8b-8192,groq:llama-3.3-70b-versatile,gemini:gemini-1.5-flash"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = ("RateLimit", "Timeout", "Connection", "InternalServer", "ServiceUnavailable", "ResourceExhausted")
+RETRY_BACKOFF = 0.5
+
+_DONE = object()
+
+
+class ProviderError(Exception):
+    """An error response from a provider, with its HTTP status code."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_retryable(error):
+    """Rate limits, timeouts, connection problems and 5xx responses are worth retrying."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return any(name in type(error).__name__ for name in RETRYABLE_NAMES)
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second with bursts up to `capacity`.
+
+    A caller takes its token up front, which may leave the bucket in debt,
+    and then sleeps until the debt is paid off. Waiters are therefore served
+    in arrival order without any of them holding a lock while asleep. The
+    bookkeeping has no await in it, so it is atomic on the event loop.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+        self._updated = now
+        if self._tokens < 0:
+            try:
+                await asyncio.sleep(-self._tokens / self.rate)
+            except asyncio.CancelledError:
+                self._tokens += 1  # hand the unused token back
+                raise
+
+
+class ChatModelProvider:
+    """
+    A LangChain chat model used through its async streaming API.
+
+    Args:
+        name (str): Label for logs and metrics, e.g. "groq:llama-3.3-70b-versatile".
+        factory (callable): Builds the chat model; called once, on first use.
+        max_concurrency (int): Requests in flight to this provider.
+        requests_per_minute (float): Token bucket rate; 0 for no limit.
+    """
+
+    def __init__(self, name, factory, max_concurrency=8, requests_per_minute=0):
+        self.name = name
+        self._factory = factory
+        self._model = None
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60)
+
+    async def astream(self, prompt):
+        if self._model is None:
+            self._model = self._factory()
+        async for chunk in self._model.astream(prompt):
+            if chunk.content:
+                yield chunk.content
+
+
+class StubProvider:
+    """
+    Local provider for tests and load runs: streams a fixed answer word by word.
+
+    Args:
+        name (str): Label for logs and metrics.
+        response (str): The answer.
+        first_token_delay (float): Seconds before the first word.
+        token_delay (float): Seconds between words.
+        failures (int): Number of initial requests that fail with a 429.
+    """
+
+    def __init__(self, name="stub", response="This is a stub answer from the local test provider.",
+                 first_token_delay=0.05, token_delay=0.01, failures=0, max_concurrency=8, requests_per_minute=0):
+        self.name = name
+        self.response = response
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.failures = failures
+        self.calls = 0
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60)
+
+    async def astream(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_delay)
+        if self.calls <= self.failures:
+            raise ProviderError(f"{self.name}: rate limited", status_code=429)
+        words = self.response.split(" ")
+        for number, word in enumerate(words):
+            if number:
+                await asyncio.sleep(self.token_delay)
+            yield word if number == len(words) - 1 else word + " "
+
+
+def build_provider(spec, api_key=None, max_concurrency=8, requests_per_minute=0, timeout=20):
+    """Create a provider from a "kind:model" spec (groq, gemini or stub)."""
+    kind, _, model = spec.partition(":")
+    if kind == "stub":
+        return StubProvider(spec, max_concurrency=max_concurrency, requests_per_minute=requests_per_minute)
+    if kind == "groq":
+        def factory():
+            from langchain_groq import ChatGroq
+            # Retries are the gateway's job
+            return ChatGroq(model=model, temperature=0, api_key=api_key("GROQ_API_KEY"), max_retries=0, timeout=timeout)
+    elif kind == "gemini":
+        def factory():
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            return ChatGoogleGenerativeAI(
+                model=model, temperature=0, google_api_key=api_key("GOOGLE_API_KEY"), max_retries=0, timeout=timeout
+            )
+    else:
+        raise ValueError(f"Unknown LLM provider: {spec}")
+    return ChatModelProvider(spec, factory, max_concurrency, requests_per_minute)
+
+
+class LLMGateway:
+    """
+    Rate-limited, retrying, failing-over access to an ordered list of providers.
+
+    Args:
+        providers (list): Providers in order of preference.
+        max_concurrency (int): Requests in flight across all providers.
+        max_retries (int): Retries per provider before failing over.
+        timeout (float): Seconds to wait for a provider's first token.
+        hedge_after (float): Start the next provider if no token has arrived
+            after this many seconds; None disables hedging.
+        idle_timeout (float): Seconds to wait for each token after the first.
+    """
+
+    def __init__(self, providers, max_concurrency=32, max_retries=2, timeout=20, hedge_after=None, idle_timeout=20):
+        self.providers = list(providers)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.idle_timeout = idle_timeout
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True)
+        self._thread.start()
+        self.retries = metrics.counter("llm_retries_total")
+        self.failovers = metrics.counter("llm_failovers_total")
+        self.hedges = metrics.counter("llm_hedges_total")
+        self.errors = metrics.counter("llm_errors_total")
+        self.queue_wait = metrics.histogram("llm_queue_wait_seconds")
+
+    async def _guarded(self, provider, prompt):
+        queued = time.perf_counter()
+        await provider.bucket.acquire()
+        async with self._global, provider.semaphore:
+            self.queue_wait.observe(time.perf_counter() - queued)
+            async for chunk in provider.astream(prompt):
+                yield chunk
+
+    async def _open(self, provider, prompt):
+        """Start a stream on one provider, retrying until its first chunk arrives."""
+        for attempt in range(self.max_retries + 1):
+            stream = self._guarded(provider, prompt)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                return provider, stream, first
+            except StopAsyncIteration:
+                return provider, stream, ""
+            except Exception as e:
+                await stream.aclose()
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.retries.inc()
+                delay = RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5)
+                print(f"LLM {provider.name} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            except BaseException:
+                await stream.aclose()
+                raise
+
+    async def _start(self, prompt):
+        """Return (provider, stream, first chunk) from the first provider that answers."""
+        tasks = [asyncio.ensure_future(self._open(self.providers[0], prompt))]
+        next_provider = 1
+        error = None
+        try:
+            while tasks:
+                can_hedge = self.hedge_after and next_provider < len(self.providers)
+                done, _ = await asyncio.wait(
+                    tasks, timeout=self.hedge_after if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.hedges.inc()
+                    tasks.append(asyncio.ensure_future(self._open(self.providers[next_provider], prompt)))
+                    next_provider += 1
+                    continue
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        for other in done - {task}:
+                            if other.exception() is None:
+                                await other.result()[1].aclose()
+                        return task.result()
+                    error = task.exception()
+                    print(f"LLM provider failed: {type(error).__name__}: {error}")
+                if not tasks and next_provider < len(self.providers):
+                    self.failovers.inc()
+                    tasks.append(asyncio.ensure_future(self._open(self.providers[next_provider], prompt)))
+                    next_provider += 1
+            self.errors.inc()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, prompt):
+        """Stream the answer to a prompt from the first provider that responds."""
+        provider, stream, first = await self._start(prompt)
+        try:
+            if first:
+                yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), self.idle_timeout)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.errors.inc()
+                    raise ProviderError(f"{provider.name}: no token for {self.idle_timeout:g}s, stream abandoned")
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stream(self, prompt):
+        """Synchronous version of astream(), for Streamlit code."""
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.astream(prompt):
+                    chunks.put(chunk)
+                chunks.put(_DONE)
+            except Exception as e:
+                chunks.put(e)
+
+        def cancelled(future):
+            # Cancellation propagates out of pump(); wake the reader if it is still waiting
+            if future.cancelled():
+                chunks.put(ProviderError("LLM request was cancelled"))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        future.add_done_callback(cancelled)
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is _DONE:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            # The reader stopped early (e.g. the page was left): cancel the request
+            future.cancel()
+
+    def invoke(self, prompt):
+        """Return the whole answer to a prompt as a string."""
+        return "".join(self.stream(prompt))
+
+
+def build_gateway(api_key=os.environ.get):
+    """
+    Create the gateway from the LLM_* environment variables.
+
+    Args:
+        api_key (callable): Looks up an API key by name, e.g. resources.secret.
+    """
+    max_concurrency = int(os.environ.get("LLM_PROVIDER_CONCURRENCY", "8"))
+    requests_per_minute = float(os.environ.get("LLM_REQUESTS_PER_MINUTE", "0"))
+    timeout = float(os.environ.get("LLM_TIMEOUT", "20"))
+    idle_timeout = float(os.environ.get("LLM_IDLE_TIMEOUT", "20"))
+    hedge_after = float(os.environ.get("LLM_HEDGE_AFTER", "0"))
+    providers = [
+        build_provider(spec.strip(), api_key, max_concurrency, requests_per_minute, timeout)
+        for spec in os.environ.get("LLM_PROVIDERS", DEFAULT_PROVIDERS).split(",")
+        if spec.strip()
+    ]
+    return LLMGateway(
+        providers,
+        max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "32")),
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", "2")),
+        timeout=timeout,
+        hedge_after=hedge_after or None,
+        idle_timeout=idle_timeout,
+    )
@@ -0,0 +1,90 @@
+"""
+Token streaming for the chatbots.
+
+stream_tokens() yields the answer piece by piece as the LLM produces it and
+records per request, in modules.metrics histograms:
+  llm_prompt_tokens                estimated prompt size, counted before the call
+  llm_time_to_first_token_seconds  from the start of the request (retrieval included)
+  llm_tokens_per_second            decode rate after the first token
+  llm_response_seconds             until the last token
+render_stream() draws the pieces into a Streamlit placeholder as they arrive.
+"""
+import time
+
+from modules import metrics, tracing
+from modules.chat_memory import count_tokens
+
+UPDATE_INTERVAL = 0.05  # seconds between redraws, so slow links get fewer, larger updates
+
+
+def prompt_tokens(prompt):
+    """Estimated tokens in a prompt given as text or as a list of chat messages."""
+    if isinstance(prompt, str):
+        return count_tokens(prompt)
+    return sum(count_tokens(message.content) for message in prompt)
+
+
+def stream_tokens(llm, prompt, started=None, name="llm"):
+    """
+    Stream an LLM answer.
+
+    Args:
+        llm: LangChain chat model or LLM with a stream() method.
+        prompt (str or list): The full prompt, as text or as chat messages.
+        started (float): time.perf_counter() when the request started; defaults to now.
+        name (str): Prefix for the metrics.
+
+    Yields:
+        str: Pieces of the answer; for Groq each piece is one token.
+    """
+    started = started or time.perf_counter()
+    time_to_first_token = metrics.histogram(f"{name}_time_to_first_token_seconds")
+    tokens_per_second = metrics.histogram(f"{name}_tokens_per_second", metrics.RATE_BUCKETS)
+    response_seconds = metrics.histogram(f"{name}_response_seconds")
+    output_tokens = metrics.counter(f"{name}_output_tokens_total")
+    metrics.histogram(f"{name}_prompt_tokens", metrics.TOKEN_BUCKETS).observe(prompt_tokens(prompt))
+
+    first_token_at = None
+    tokens = 0
+    llm_started = time.perf_counter()
+    try:
+        for chunk in llm.stream(prompt):
+            text = getattr(chunk, "content", chunk)
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                time_to_first_token.observe(first_token_at - started)
+            tokens += 1
+            yield text
+    except Exception:
+        tracing.record(name, time.perf_counter() - llm_started, error=True, started=llm_started)
+        raise
+
+    finished = time.perf_counter()
+    tracing.record(name, finished - llm_started, started=llm_started)
+    response_seconds.observe(finished - started)
+    output_tokens.inc(tokens)
+    if tokens > 1 and finished > first_token_at:
+        tokens_per_second.observe((tokens - 1) / (finished - first_token_at))
+
+
+def render_stream(chunks, placeholder, template="{}"):
+    """
+    Show streamed text in a placeholder (st.empty()) and return the full text.
+
+    Args:
+        chunks (iterable): Pieces of text.
+        placeholder: Streamlit placeholder to draw into.
+        template (str): HTML around the text, with {} where the text goes.
+    """
+    text = ""
+    last_update = 0.0
+    for chunk in chunks:
+        text += chunk
+        now = time.perf_counter()
+        if now - last_update >= UPDATE_INTERVAL:
+            placeholder.markdown(template.format(text + " ▌"), unsafe_allow_html=True)
+            last_update = now
+    placeholder.markdown(template.format(text), unsafe_allow_html=True)
+    return text
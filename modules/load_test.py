@@ -0,0 +1,518 @@
+"""
+Load test for the app's four sections with stubbed backends.
+
+Simulates N concurrent sessions per section, each sending the same sequence
+of requests through the code the Streamlit pages call:
+  chatbot   ai_bot.stream_response() with the session's ChatMemory
+  schemes   schemes.stream_response() with the session's ChatMemory
+  disease   preprocess_image() + the shared batching queue, as predict_crop_disease()
+  news      reading the news snapshot and rendering one page of cards (modules/news_page.py)
+Sections run one after another so each gets its own throughput, latency
+percentiles and peak RSS. Per-stage timings cover embedding, FAISS search,
+retrieval (BM25 + fusion + rerank), LLM calls, image preprocessing, the wait
+for a batch to start (queue_wait), the rest of the time until the result is
+back (inference) and model.predict per batch.
+
+Everything outside the process is replaced by deterministic stand-ins with a
+fixed latency: the LLM is a StubProvider behind the real LLMGateway, query
+embeddings are hash-seeded vectors, the chatbot stores are built from a
+generated corpus and the photos are generated JPEGs. The crop model is the
+configured backend unless --crop-backend stub is given. Questions, images
+and the stand-ins are seeded, so two runs on the same machine do the same
+work and results can be compared across commits:
+
+    python -m modules.load_test --sessions 8 --requests 20 --output before.json
+    python -m modules.load_test --sessions 8 --requests 20 --baseline before.json
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from modules import resources
+
+SECTIONS = ("chatbot", "disease", "schemes", "news")
+
+QUESTIONS = [
+    "Which fertilizer should I use for wheat in black soil?",
+    "How do I get a Kisan Credit Card (KCC) loan?",
+    "What is the premium for PMFBY crop insurance for soybean?",
+    "How can I control late blight in potato?",
+    "Am I eligible for PM-KISAN with two acres of land?",
+    "What subsidy is available for drip irrigation in Maharashtra?",
+    "When should I sow cotton after the monsoon arrives?",
+    "How do I apply for the Namo Shetkari Mahasanman Nidhi?",
+    "What is a good crop rotation after sugarcane?",
+    "How much water does onion need in the rabi season?",
+]
+
+_CORPUS_WORDS = (
+    "farmer crop wheat rice cotton soybean onion sugarcane potato tomato soil irrigation drip fertilizer urea "
+    "compost yield monsoon kharif rabi scheme subsidy insurance premium loan credit KCC PMFBY PM-KISAN eligibility "
+    "application district taluka land acre hectare seed pesticide fungicide blight rust harvest market price "
+    "Maharashtra government installment bank document aadhaar claim weather rainfall"
+).split()
+
+_local = threading.local()
+
+
+def record_stage(name, seconds):
+    """Add time measured by the caller to a stage of the request running on this thread."""
+    stages = getattr(_local, "stages", None)
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    """Time a block as one stage of the request running on this thread."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic embeddings with a fixed latency, standing in for the remote API.
+
+    The same text always gets the same unit vector, seeded from its hash.
+
+    Args:
+        dim (int): Vector size.
+        latency (float): Seconds per call, like one API round trip.
+    """
+
+    model_name = "stub"
+
+    def __init__(self, dim=768, latency=0.05):
+        self.dim = dim
+        self.latency = latency
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim, dtype=np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        with stage("embedding"):
+            time.sleep(self.latency)
+            return self._vector(text)
+
+
+class _TimedIndex:
+    """FAISS index wrapper that times search() as its own stage."""
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    def search(self, *args, **kwargs):
+        with stage("faiss_search"):
+            return self._index.search(*args, **kwargs)
+
+
+class _TimedLLM:
+    """LLM gateway wrapper that times every stream() and invoke() as the llm stage."""
+
+    def __init__(self, llm):
+        self._llm = llm
+
+    def stream(self, prompt):
+        started = time.perf_counter()
+        try:
+            yield from self._llm.stream(prompt)
+        finally:
+            stages = getattr(_local, "stages", None)
+            if stages is not None:
+                stages["llm"] = stages.get("llm", 0.0) + time.perf_counter() - started
+
+    def invoke(self, prompt):
+        return "".join(self.stream(prompt))
+
+
+class _StubCropModel:
+    """Crop model stand-in: fixed cost per batch and per image, seeded outputs."""
+
+    def __init__(self, classes, batch_latency=0.02, image_latency=0.005):
+        self.classes = classes
+        self.batch_latency = batch_latency
+        self.image_latency = image_latency
+
+    def predict(self, batch, batch_size=None, verbose=0):
+        time.sleep(self.batch_latency + self.image_latency * len(batch))
+        rng = np.random.default_rng(len(batch))
+        scores = rng.random((len(batch), self.classes), dtype=np.float32) ** 4
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+def fixture_corpus(chunks=2000, words=120, seed=0):
+    """Generate chunk texts with the vocabulary of the real scheme and farming PDFs."""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(_CORPUS_WORDS) for _ in range(words)) + "."
+        for _ in range(chunks)
+    ]
+
+
+def fixture_images(count=16, size=(1600, 1200), seed=0):
+    """
+    Generate JPEG bytes the size of phone photos, with leaf-like colour noise.
+
+    Smooth noise compresses and decodes like a real photo; white noise would not.
+    """
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        coarse = rng.integers(0, 256, (size[1] // 40, size[0] // 40, 3), dtype=np.uint8)
+        coarse[..., 1] = np.maximum(coarse[..., 1], 120)  # mostly green
+        image = Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def load_images(folder, limit=64):
+    """Read up to `limit` photos from a folder, in name order."""
+    from modules.bulk_scorer import iter_images
+    images = []
+    for _, path in iter_images(folder):
+        with open(path, "rb") as handle:
+            images.append(handle.read())
+        if len(images) >= limit:
+            break
+    return images
+
+
+def _timed_retriever(store):
+    from modules.hybrid_retrieval import HybridRetriever
+    store.index = _TimedIndex(store.index)
+    retriever = HybridRetriever(store)
+    retrieve = retriever.retrieve
+
+    def timed_retrieve(*args, **kwargs):
+        with stage("retrieval"):
+            return retrieve(*args, **kwargs)
+
+    retriever.retrieve = timed_retrieve
+    return retriever
+
+
+def install_stubs(args):
+    """
+    Register stand-ins for the LLM, embeddings, stores and (optionally) the crop model.
+
+    Must run before any of them is loaded.
+    """
+    from modules.faiss_indexes import build_vector_store
+    from modules.inference_queue import BatchingQueue
+    from modules.llm_gateway import LLMGateway, StubProvider
+
+    embeddings = StubEmbeddings(dim=args.dim, latency=args.embedding_latency)
+    answer = " ".join(random.Random(1).choice(_CORPUS_WORDS) for _ in range(args.answer_words)) + "."
+
+    def load_llm():
+        provider = StubProvider(response=answer, first_token_delay=args.llm_ttft, token_delay=args.llm_token_delay)
+        return _TimedLLM(LLMGateway([provider], max_concurrency=args.llm_concurrency))
+
+    def load_store(seed):
+        def _load():
+            texts = fixture_corpus(args.chunks, seed=seed)
+            vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+            store = build_vector_store(texts, vectors, embeddings, index_type=args.index_type)
+            retriever = _timed_retriever(store)
+
+            class _Current:
+                def current(self):
+                    return retriever
+            return _Current()
+        return _load
+
+    resources.register("embeddings", lambda: embeddings)
+    resources.register("llm", load_llm)
+    resources.register("vectordb:Smart Farming", load_store(1))
+    resources.register("vectordb:Schemes", load_store(2))
+
+    model_stats = []
+    model_lock = threading.Lock()
+
+    def load_crop_queue():
+        if args.crop_backend == "stub":
+            from modules.crop_disease_detector import class_names
+            model = _StubCropModel(len(class_names))
+        else:
+            from modules.inference_backends import load_backend
+            model = load_backend(args.crop_backend)
+
+        def predict(batch):
+            started = time.perf_counter()
+            output = model.predict(batch)
+            with model_lock:
+                model_stats.append(time.perf_counter() - started)
+            return output
+
+        return BatchingQueue(predict, max_batch_size=args.crop_batch, max_wait_ms=args.crop_window_ms)
+
+    resources.register("crop_queue", load_crop_queue)
+    return model_stats
+
+
+def _chat_request(module):
+    """Build a request function that asks one question in a session's conversation."""
+    from modules.chat_memory import ChatMemory, llm_summarizer
+
+    def request(session, number):
+        if number == 0:
+            session["memory"] = ChatMemory()
+        memory = session["memory"]
+        question = QUESTIONS[(session["id"] + number) % len(QUESTIONS)]
+        retriever = module.load_vectordb()
+        answer = "".join(module.stream_response(question, memory.prompt_history(), retriever, "en", use_cache=False))
+        memory.add("user", question)
+        memory.add("assistant", answer)
+        memory.compact(llm_summarizer(resources.get("llm")))
+
+    return request
+
+
+def _disease_request(images):
+    from PIL import Image
+    from modules.crop_disease_detector import interpret_prediction, preprocess_image
+
+    def request(session, number):
+        payload = images[(session["id"] * 7 + number) % len(images)]
+        with stage("preprocess"):
+            with Image.open(io.BytesIO(payload)) as image:
+                data = preprocess_image(image)
+        started = time.perf_counter()
+        future = resources.get("crop_queue").submit(data)
+        prediction = future.result()
+        # Split the wait for a batch from the forward pass it then shares
+        record_stage("queue_wait", future.queue_seconds)
+        record_stage("inference", time.perf_counter() - started - future.queue_seconds)
+        interpret_prediction(prediction[0])
+
+    return request
+
+
+def _news_request(path, page_size=20):
+    from modules.news_page import load_news, page_count, render_news_page
+
+    def request(session, number):
+        with stage("load_snapshot"):
+            news = load_news(path)
+        with stage("render_page"):
+            render_news_page(news, (session["id"] + number) % page_count(news, page_size), page_size)
+
+    return request
+
+
+def _sample_rss(stop, peak):
+    while not stop.wait(0.005):
+        peak[0] = max(peak[0], resources._rss_bytes())
+
+
+def run_section(name, request, sessions, requests, warmup=1, on_start=None):
+    """
+    Run `sessions` concurrent sessions of `requests` sequential requests each.
+
+    Every session first sends `warmup` untimed requests; the timed part starts
+    for all sessions at once, after on_start() is called. The section's
+    duration runs from that start to the end of the last timed request, and
+    RSS is sampled over the same span.
+
+    Returns:
+        dict: Latencies, per-stage timings, throughput, peak RSS and errors.
+    """
+    latencies = []
+    stages = {}
+    errors = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    peak = [0]
+    clock = {"finished": 0.0}
+
+    def begin():
+        # Runs once every session has finished its warm-up, before any timed request is released
+        if on_start is not None:
+            on_start()
+        clock["rss_before"] = peak[0] = resources._rss_bytes()
+        threading.Thread(target=_sample_rss, args=(stop, peak), daemon=True).start()
+        clock["started"] = time.perf_counter()
+
+    start = threading.Barrier(sessions + 1, action=begin)
+
+    def session_loop(session_id):
+        session = {"id": session_id}
+        for number in range(warmup):
+            try:
+                request(session, number)
+            except Exception as e:
+                with lock:
+                    errors.append(f"warmup: {type(e).__name__}: {e}")
+        start.wait()
+        for number in range(warmup, warmup + requests):
+            _local.stages = {}
+            started = time.perf_counter()
+            try:
+                request(session, number)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            finally:
+                finished = time.perf_counter()
+                elapsed = finished - started
+                request_stages, _local.stages = _local.stages, None
+                with lock:
+                    clock["finished"] = max(clock["finished"], finished)
+            with lock:
+                latencies.append(elapsed)
+                for stage_name, seconds in request_stages.items():
+                    stages.setdefault(stage_name, []).append(seconds)
+
+    threads = [threading.Thread(target=session_loop, args=(i,), name=f"{name}-session-{i}") for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    elapsed = max(clock["finished"] - clock["started"], 0.0)
+    rss_before = clock["rss_before"]
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "stages": {stage_name: summarize(values) for stage_name, values in sorted(stages.items())},
+        "rss_mb": rss_before / 2**20,
+        "peak_rss_mb": peak[0] / 2**20,
+    }
+
+
+def summarize(values):
+    """Count, mean and p50/p95/p99 of a list of seconds, in milliseconds."""
+    if not values:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    values = np.asarray(values) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "mean_ms": float(values.mean()), "p50_ms": float(p50),
+            "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def format_report(results, baseline=None):
+    """Format section and stage results as tables, with changes against a baseline run."""
+    def change(section, key, value):
+        if not baseline or section not in baseline["sections"]:
+            return ""
+        old = baseline["sections"][section]
+        old = old[key] if key in ("throughput", "peak_rss_mb") else old["latency"][key]
+        return f" ({(value - old) / old:+.0%})" if old else ""
+
+    lines = [f"{'section':<9} {'req':>5} {'err':>4} {'req/s':>16} {'p50 ms':>16} {'p95 ms':>16} "
+             f"{'p99 ms':>16} {'peak RSS MB':>18}"]
+    for section, result in results["sections"].items():
+        latency = result["latency"]
+        lines.append(
+            f"{section:<9} {result['requests']:>5} {result['errors']:>4} "
+            f"{result['throughput']:>8.1f}{change(section, 'throughput', result['throughput']):<8} "
+            + " ".join(f"{latency[key]:>8.1f}{change(section, key, latency[key]):<7}"
+                       for key in ("p50_ms", "p95_ms", "p99_ms"))
+            + f" {result['peak_rss_mb']:>10.1f}{change(section, 'peak_rss_mb', result['peak_rss_mb']):<8}"
+        )
+    lines.append("")
+    lines.append(f"{'section':<9} {'stage':<16} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for section, result in results["sections"].items():
+        for stage_name, values in result["stages"].items():
+            lines.append(f"{section:<9} {stage_name:<16} {values['count']:>6} {values['mean_ms']:>9.1f} "
+                         f"{values['p50_ms']:>9.1f} {values['p95_ms']:>9.1f} {values['p99_ms']:>9.1f}")
+    for section, result in results["sections"].items():
+        for sample in result["error_samples"]:
+            lines.append(f"{section} error: {sample}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the app's sections with stubbed backends.")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions per section")
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests per session")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed requests per session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--images", help="Folder of photos to use instead of generated ones")
+    parser.add_argument("--chunks", type=int, default=2000, help="Chunks per generated store")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding size")
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Seconds per stub embedding call")
+    parser.add_argument("--llm-ttft", type=float, default=0.3, help="Seconds to the stub LLM's first token")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="Seconds between stub LLM tokens")
+    parser.add_argument("--answer-words", type=int, default=80)
+    parser.add_argument("--llm-concurrency", type=int, default=32)
+    parser.add_argument("--crop-backend", default=None,
+                        help="keras, tflite, onnx or stub (default: $CROP_MODEL_BACKEND or keras)")
+    parser.add_argument("--crop-batch", type=int, default=16)
+    parser.add_argument("--crop-window-ms", type=float, default=10)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)  # remedy choice in interpret_prediction()
+    model_stats = install_stubs(args)
+    requests = {}
+    if "chatbot" in args.sections:
+        requests["chatbot"] = _chat_request(resources.import_module("modules.ai_bot"))
+    if "disease" in args.sections:
+        images = load_images(args.images) if args.images else fixture_images(seed=args.seed)
+        requests["disease"] = _disease_request(images)
+    if "schemes" in args.sections:
+        requests["schemes"] = _chat_request(resources.import_module("modules.schemes"))
+    if "news" in args.sections:
+        from modules.news_refresher import NEWS_CSV_PATH
+        requests["news"] = _news_request(NEWS_CSV_PATH)
+
+    # Load stores and models up front so no section pays for them
+    warm = [name for name in ("llm", "embeddings", "vectordb:Smart Farming", "vectordb:Schemes", "crop_queue")
+            if name != "crop_queue" or "disease" in args.sections]
+    resources.warm(warm)
+
+    results = {"args": vars(args), "sections": {}}
+    for section in SECTIONS:
+        if section in requests:
+            print(f"Running {section}: {args.sessions} sessions x {args.requests} requests")
+            result = run_section(section, requests[section], args.sessions, args.requests, args.warmup,
+                                 on_start=model_stats.clear)
+            if section == "disease":
+                result["stages"]["model.predict"] = summarize(list(model_stats))
+            results["sections"][section] = result
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+    print(format_report(results, baseline))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Local, CPU-only sentence embeddings (all-MiniLM-L6-v2 on ONNX Runtime).
+
+Removes the network hop to the remote embedding API from every chat turn.
+The model stays resident once loaded, and concurrent embed_query() calls
+are grouped into one forward pass by the same BatchingQueue used for the
+crop disease model.
+
+The ONNX model and tokenizer are downloaded from the Hugging Face Hub on
+first use into LOCAL_EMBEDDING_MODEL_DIR. Set LOCAL_EMBEDDING_ONNX_FILE to
+one of the quantized exports (e.g. onnx/model_quint8_avx2.onnx) to trade a
+little accuracy for speed.
+
+Needs the optional packages onnxruntime, tokenizers and huggingface_hub
+(see requirements.txt), which the default remote backend does not use.
+"""
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from modules.inference_queue import BatchingQueue
+
+MODEL_REPO = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_DIR = os.environ.get("LOCAL_EMBEDDING_MODEL_DIR", "./assets/all-MiniLM-L6-v2")
+ONNX_FILE = os.environ.get("LOCAL_EMBEDDING_ONNX_FILE", "onnx/model.onnx")
+INSTALL_HINT = "EMBEDDING_BACKEND=local needs: pip install onnxruntime tokenizers huggingface_hub"
+
+
+def ensure_model(model_dir=MODEL_DIR, onnx_file=ONNX_FILE):
+    """Download the ONNX model and tokenizer if they aren't in model_dir yet."""
+    if not os.path.exists(os.path.join(model_dir, onnx_file)):
+        try:
+            from huggingface_hub import snapshot_download
+        except ImportError as e:
+            raise ImportError(f"{INSTALL_HINT} ({e})") from e
+        snapshot_download(MODEL_REPO, local_dir=model_dir, allow_patterns=[onnx_file, "tokenizer.json"])
+    return model_dir
+
+
+class LocalMiniLMEmbeddings(Embeddings):
+    """
+    MiniLM sentence embeddings computed in-process on the CPU.
+
+    Args:
+        model_dir (str): Directory holding tokenizer.json and the ONNX file.
+        onnx_file (str): Model file relative to model_dir.
+        batch_size (int): Texts per forward pass.
+        max_length (int): Token limit per text; longer texts are truncated.
+        num_threads (int): ONNX Runtime intra-op threads (default: runtime's choice).
+    """
+
+    model_name = MODEL_REPO
+
+    def __init__(self, model_dir=MODEL_DIR, onnx_file=ONNX_FILE, batch_size=32, max_length=256, num_threads=None):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(f"{INSTALL_HINT} ({e})") from e
+
+        model_dir = ensure_model(model_dir, onnx_file)
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, onnx_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self._queries = BatchingQueue(self._encode, max_batch_size=batch_size, max_wait_ms=5, name="local_embeddings")
+
+    def _encode(self, texts):
+        """Embed a batch of texts; returns L2-normalized float32 vectors of shape (n, 384)."""
+        encodings = self.tokenizer.encode_batch([str(text) for text in texts])
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text):
+        return self._queries.predict(np.array([text], dtype=object))[0].tolist()
@@ -0,0 +1,138 @@
+"""
+Minimal in-process metrics shared by the app's hot paths.
+
+Histograms use fixed, cumulative buckets in the Prometheus style so they can
+be exported later without keeping every observation in memory.
+"""
+import bisect
+import threading
+
+# Seconds: 1 ms .. 30 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Items per batch
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+# Prompt and response sizes in tokens
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+# Tokens per second
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+
+
+class Counter:
+    """Thread-safe monotonically increasing counter."""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Histogram:
+    """Thread-safe histogram with fixed upper bounds."""
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        """
+        Return the current state of the histogram.
+
+        Returns:
+            dict: "buckets" as a list of (upper bound, cumulative count) pairs
+                  ending with float("inf"), plus "count" and "sum".
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative, running = [], 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return {"buckets": cumulative, "count": count, "sum": total}
+
+    def quantile(self, q):
+        """Estimate the q-th quantile (0..1) as the upper bound of its bucket."""
+        snap = self.snapshot()
+        if not snap["count"]:
+            return 0.0
+        target = q * snap["count"]
+        for bound, running in snap["buckets"]:
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+def histogram(name, buckets=LATENCY_BUCKETS):
+    """Return the process-wide histogram with the given name, creating it if needed."""
+    with _lock:
+        if name not in _histograms:
+            _histograms[name] = Histogram(name, buckets)
+        return _histograms[name]
+
+
+def histograms():
+    """Return every registered histogram keyed by name."""
+    with _lock:
+        return dict(_histograms)
+
+
+def counter(name):
+    """Return the process-wide counter with the given name, creating it if needed."""
+    with _lock:
+        if name not in _counters:
+            _counters[name] = Counter(name)
+        return _counters[name]
+
+
+def counters():
+    """Return every registered counter keyed by name."""
+    with _lock:
+        return dict(_counters)
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_prometheus():
+    """
+    Return every histogram and counter in the Prometheus text exposition format.
+
+    Hit rates and error ratios are left to the scraper, e.g.
+    rate(embedding_cache_hits_total[5m]) / (rate(..._hits_total[5m]) + rate(..._misses_total[5m])).
+    """
+    lines = []
+    for name, counter_ in sorted(counters().items()):
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {counter_.value}")
+    for name, histogram_ in sorted(histograms().items()):
+        snap = histogram_.snapshot()
+        lines.append(f"# TYPE {name} histogram")
+        for bound, running in snap["buckets"]:
+            lines.append(f'{name}_bucket{{le="{_format_bound(bound)}"}} {running}')
+        lines.append(f"{name}_sum {snap['sum']}")
+        lines.append(f"{name}_count {snap['count']}")
+    return "\n".join(lines) + "\n"
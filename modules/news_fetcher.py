@@ -1,9 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 import pandas as pd
+import os
+import time
+from modules import tracing
+from modules.news_store import NEWS_STORE_PATH, NewsStore
 
-def scrape_agriculture_news(base_url, max_pages=5, use_original_logic=False, language="en"):
+# Fetch limits: every request goes through fetch(), which reuses one pooled
+# Session per host and caps concurrency both per host and overall.
+REQUEST_TIMEOUT = (5, 15)  # (connect, read) seconds
+MAX_CONNECTIONS = 16
+MAX_CONNECTIONS_PER_HOST = 4
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds, doubled on every retry
+MAX_RETRY_WAIT = 10  # seconds; caps Retry-After
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_host_limits = {}
+_sessions_lock = threading.Lock()
+_global_limit = threading.BoundedSemaphore(MAX_CONNECTIONS)
+
+def _session_for(url):
+    """Return the shared Session and concurrency limit for the URL's host."""
+    host = urlparse(url).netloc
+    with _sessions_lock:
+        if host not in _sessions:
+            # No adapter retries: fetch() retries itself, so it never sleeps holding a connection slot
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONNECTIONS_PER_HOST, max_retries=0)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.verify = False
+            _sessions[host] = session
+            _host_limits[host] = threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST)
+        return _sessions[host], _host_limits[host]
+
+def _retry_delay(attempt, response=None):
+    """Seconds to wait before the next attempt: Retry-After if the server sent one, else exponential backoff."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_WAIT)
+    return min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_WAIT)
+
+def fetch(url, headers=None):
+    """
+    GET a URL with connection reuse, timeouts and retry with backoff.
+
+    The host and global connection slots are held for one attempt at a time
+    and released while waiting to retry, so a flaky host doesn't hold up
+    fetches from other hosts.
+
+    Args:
+        url (str): URL to fetch.
+        headers (dict): Extra request headers.
+
+    Returns:
+        requests.Response: The successful response.
+
+    Raises:
+        requests.exceptions.RequestException: If the request still fails after retries.
+    """
+    session, host_limit = _session_for(url)
+    with tracing.span("fetch"):
+        for attempt in range(MAX_RETRIES + 1):
+            response = None
+            try:
+                with host_limit, _global_limit:
+                    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                    break
+            time.sleep(_retry_delay(attempt, response))
+        response.raise_for_status()
+    return response
+
+def scrape_agriculture_news(base_url, max_pages=5, use_original_logic=False, language="en", store=None):
     """
     Scrape agriculture news from a given base URL.
 
@@ -12,6 +91,8 @@ def scrape_agriculture_news(base_url, max_pages=5, use_original_logic=False, lan
         max_pages (int): Maximum number of pages to scrape.
         use_original_logic (bool): If True, uses the original logic (for Indian Express).
         language (str): "en" for English or "mr" for Marathi.
+        store (NewsStore): If given, send a conditional request and reuse the
+            stored links when the page hasn't changed (HTTP 304).
 
     Returns:
         list: List of valid news article URLs.
@@ -21,27 +102,33 @@ def scrape_agriculture_news(base_url, max_pages=5, use_original_logic=False, lan
         'Referer': base_url,
         'Accept-Language': 'en-US,en;q=0.9',
     }
+    if store is not None:
+        headers.update(store.conditional_headers(base_url))
 
     agriculture_news_urls = []
 
     try:
-        response = requests.get(base_url, headers=headers, verify=False)
-        response.raise_for_status()
+        response = fetch(base_url, headers=headers)
+        if store is not None and response.status_code == 304:
+            return store.page_links(base_url)
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        with tracing.span("parse"):
+            soup = BeautifulSoup(response.text, 'html.parser')
 
-        if use_original_logic:
-            # Using the original method for Indian Express
-            news_links = soup.find_all('a', href=True, text=lambda text: text and ('agriculture' in text.lower() or 'farming' in text.lower()))
-        else:
-            # Using the improved method for other sites
-            news_links = soup.find_all('a', href=True, string=lambda text: text and ('agriculture' in text.lower() or 'farming' in text.lower()))
+            if use_original_logic:
+                # Using the original method for Indian Express
+                news_links = soup.find_all('a', href=True, text=lambda text: text and ('agriculture' in text.lower() or 'farming' in text.lower()))
+            else:
+                # Using the improved method for other sites
+                news_links = soup.find_all('a', href=True, string=lambda text: text and ('agriculture' in text.lower() or 'farming' in text.lower()))
 
         for link in news_links[:max_pages]:
             full_url = urljoin(base_url, link['href'])
             if full_url not in agriculture_news_urls:
                 agriculture_news_urls.append(full_url)
 
+        if store is not None:
+            store.save_page(base_url, response.headers.get("ETag"), response.headers.get("Last-Modified"), agriculture_news_urls)
         return agriculture_news_urls
 
     except requests.exceptions.RequestException as e:
@@ -51,57 +138,61 @@ def scrape_agriculture_news(base_url, max_pages=5, use_original_logic=False, lan
             print(f"Error scraping {base_url}: {e}")
         return []
 
-def extract_news_details(news_urls, language="en"):
-    """
-    Extracts titles and descriptions from the given news URLs.
+def _extract_one(url, headers, language):
+    """Fetch one article and return (title, description, ok)."""
+    try:
+        response = fetch(url, headers=headers)
 
-    Args:
-        news_urls (list): List of news article URLs.
-        language (str): "en" for English or "mr" for Marathi.
+        with tracing.span("parse"):
+            soup = BeautifulSoup(response.text, 'html.parser')
 
-    Returns:
-        tuple: A tuple containing two lists - one for titles and another for descriptions.
-    """
-    titles = []
-    descriptions = []
+        # Extract title
+        title_tag = soup.find('title')
+        if title_tag:
+            title = title_tag.text.strip()
+        else:
+            title = "No Title Found" if language == "en" else "शिर्षक सापडले नाही"
 
+        # Extract description (from meta tag)
+        description_tag = soup.find('meta', attrs={'name': 'description'})
+        if description_tag and 'content' in description_tag.attrs:
+            description = description_tag['content'].strip()
+        else:
+            description = "No Description Found" if language == "en" else "वर्णन सापडले नाही"
+        return title, description, True
+
+    except requests.exceptions.RequestException as e:
+        if language == "mr":
+            print(f"{url} साठी डेटा प्राप्त करताना त्रुटी: {e}")
+            return "शिर्षक प्राप्त करताना त्रुटी", "वर्णन प्राप्त करताना त्रुटी", False
+        print(f"Error fetching {url}: {e}")
+        return "Error Fetching Title", "Error Fetching Description", False
+
+def _extract_all(news_urls, language):
+    """Fetch articles concurrently; returns (title, description, ok) per URL, in order."""
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
 
-    for url in news_urls:
-        try:
-            response = requests.get(url, headers=headers, verify=False)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.text, 'html.parser')
+    with ThreadPoolExecutor(max_workers=MAX_CONNECTIONS) as executor:
+        return list(executor.map(lambda url: _extract_one(url, headers, language), news_urls))
 
-            # Extract title
-            title_tag = soup.find('title')
-            if title_tag:
-                title = title_tag.text.strip()
-            else:
-                title = "No Title Found" if language == "en" else "शिर्षक सापडले नाही"
-            titles.append(title)
+def extract_news_details(news_urls, language="en"):
+    """
+    Extracts titles and descriptions from the given news URLs.
 
-            # Extract description (from meta tag)
-            description_tag = soup.find('meta', attrs={'name': 'description'})
-            if description_tag and 'content' in description_tag.attrs:
-                description = description_tag['content'].strip()
-            else:
-                description = "No Description Found" if language == "en" else "वर्णन सापडले नाही"
-            descriptions.append(description)
+    Articles are fetched concurrently; results keep the order of news_urls.
 
-        except requests.exceptions.RequestException as e:
-            if language == "mr":
-                titles.append("शिर्षक प्राप्त करताना त्रुटी")
-                descriptions.append("वर्णन प्राप्त करताना त्रुटी")
-                print(f"{url} साठी डेटा प्राप्त करताना त्रुटी: {e}")
-            else:
-                titles.append("Error Fetching Title")
-                descriptions.append("Error Fetching Description")
-                print(f"Error fetching {url}: {e}")
+    Args:
+        news_urls (list): List of news article URLs.
+        language (str): "en" for English or "mr" for Marathi.
 
+    Returns:
+        tuple: A tuple containing two lists - one for titles and another for descriptions.
+    """
+    details = _extract_all(news_urls, language)
+    titles = [title for title, _, _ in details]
+    descriptions = [description for _, description, _ in details]
     return titles, descriptions
 
 def save_news_to_csv_pandas(news_urls, titles, descriptions, filename="./assets/agriculture_news.csv", language="en"):
@@ -122,20 +213,50 @@ def save_news_to_csv_pandas(news_urls, titles, descriptions, filename="./assets/
         "Desc": descriptions
     })
 
-    # Save to CSV
-    df.to_csv(filename, index=False, encoding="utf-8")
+    # Save to CSV: write a temporary file and rename it over the old one, so
+    # readers always see either the previous or the new complete file
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    df.to_csv(tmp_filename, index=False, encoding="utf-8")
+    os.replace(tmp_filename, filename)
 
     if language == "mr":
         print(f"बातम्या यशस्वीरित्या {filename} मध्ये जतन केल्या.")
     else:
         print(f"News data saved successfully to {filename}.")
 
-def scrapper(language="en"):
+def merge_news_into_csv(news_urls, titles, descriptions, filename="./assets/agriculture_news.csv", language="en"):
+    """
+    Adds new articles to the top of an existing news CSV, keeping older rows.
+
+    Args:
+        news_urls (list): List of new article URLs.
+        titles (list): List of news titles.
+        descriptions (list): List of news descriptions.
+        filename (str): CSV file to merge into (created if missing).
+        language (str): "en" for English or "mr" for Marathi.
+    """
+    new_rows = pd.DataFrame({
+        "Link": news_urls,
+        "Title": titles,
+        "Desc": descriptions
+    })
+    if os.path.exists(filename):
+        new_rows = pd.concat([new_rows, pd.read_csv(filename)], ignore_index=True)
+    merged = new_rows.drop_duplicates(subset="Link", keep="first")
+
+    save_news_to_csv_pandas(merged["Link"].tolist(), merged["Title"].tolist(), merged["Desc"].tolist(),
+                            filename=filename, language=language)
+
+def scrapper(language="en", incremental=False, store_path=NEWS_STORE_PATH):
     """
     Collects agriculture news from multiple sites, extracts details, and saves them to a CSV file.
 
     Args:
         language (str): "en" for English or "mr" for Marathi.
+        incremental (bool): If True, use conditional requests for index pages,
+            only download articles not seen before, and merge them into the
+            existing CSV instead of rewriting it.
+        store_path (str): SQLite file holding the crawl state for incremental mode.
     """
     # List of agriculture news sites
     AGRICULTURE_NEWS_SITES = [
@@ -148,18 +269,44 @@ def scrapper(language="en"):
         'https://indianexpress.com/about/agriculture/'
     ]
 
-    # Collect news URLs
-    all_agriculture_news_urls = []
+    store = NewsStore(store_path) if incremental else None
+
+    try:
+        # Collect news URLs
+        all_agriculture_news_urls = []
+
+        # Index pages are fetched concurrently, so this takes as long as the slowest site
+        with ThreadPoolExecutor(max_workers=len(AGRICULTURE_NEWS_SITES)) as executor:
+            site_results = executor.map(
+                lambda site: scrape_agriculture_news(site, use_original_logic=(site == 'https://indianexpress.com/about/agriculture/'), language=language, store=store),
+                AGRICULTURE_NEWS_SITES,
+            )
+            for news_urls in site_results:
+                all_agriculture_news_urls.extend(news_urls)
 
-    for site in AGRICULTURE_NEWS_SITES:
-        news_urls = scrape_agriculture_news(site, use_original_logic=(site == 'https://indianexpress.com/about/agriculture/'), language=language)
-        all_agriculture_news_urls.extend(news_urls)
+        # Filter out URLs that are from the agriculture news sites
+        filtered_news_urls = [url for url in all_agriculture_news_urls if not any(site in url for site in AGRICULTURE_NEWS_SITES)]
 
-    # Filter out URLs that are from the agriculture news sites
-    filtered_news_urls = [url for url in all_agriculture_news_urls if not any(site in url for site in AGRICULTURE_NEWS_SITES)]
+        if incremental:
+            # Only articles never extracted before; failed fetches are retried next run
+            new_urls = store.unseen(list(dict.fromkeys(filtered_news_urls)))
+            details = _extract_all(new_urls, language)
+            fetched = [(url, title, description) for url, (title, description, ok) in zip(new_urls, details) if ok]
+            if language == "mr":
+                print(f"{len(new_urls)} नवीन लेख सापडले, {len(fetched)} प्राप्त केले.")
+            else:
+                print(f"Found {len(new_urls)} new articles, fetched {len(fetched)}.")
+            if fetched:
+                urls, titles, descriptions = (list(column) for column in zip(*fetched))
+                merge_news_into_csv(urls, titles, descriptions, language=language)
+                store.save_articles(urls, titles, descriptions)
+            return
 
-    # Extract titles and descriptions
-    titles_list, descriptions_list = extract_news_details(filtered_news_urls, language=language)
+        # Extract titles and descriptions
+        titles_list, descriptions_list = extract_news_details(filtered_news_urls, language=language)
 
-    # Save to CSV using pandas
-    save_news_to_csv_pandas(filtered_news_urls, titles_list, descriptions_list, language=language)
+        # Save to CSV using pandas
+        save_news_to_csv_pandas(filtered_news_urls, titles_list, descriptions_list, language=language)
+    finally:
+        if store is not None:
+            store.close()
@@ -0,0 +1,36 @@
+"""
+Rendering of the agriculture news page.
+
+Kept out of main-app.py so the load test renders exactly the cards the page
+shows. main-app.py wraps both functions in st.cache_data keyed on the
+snapshot's mtime.
+"""
+import html
+
+
+def load_news(file_path):
+    """Read a news snapshot CSV (Link, Title, Desc) with empty cells as ""."""
+    import pandas as pd
+    return pd.read_csv(file_path).fillna("")
+
+
+def page_count(news_df, page_size):
+    """Number of pages of page_size cards, at least 1."""
+    return max((len(news_df) + page_size - 1) // page_size, 1)
+
+
+def render_news_page(news_df, page, page_size):
+    """Render one page (0-based) of news cards as a single HTML block."""
+    rows = news_df.iloc[page * page_size:(page + 1) * page_size]
+    cards = []
+    for link, title, desc in zip(rows["Link"], rows["Title"], rows["Desc"]):
+        cards.append(
+            f"""
+            <div style="border:1px solid #ddd; padding:10px; border-radius:10px; margin-bottom:10px; background-color:#f9f9f9;">
+                <h4 style="color:#2E7D32;">{html.escape(str(title))}</h4>
+                <p>{html.escape(str(desc))}</p>
+                <a href="{html.escape(str(link), quote=True)}" target="_blank" style="color:#1E88E5; text-decoration:none;">Read more</a>
+            </div>
+            """
+        )
+    return "".join(cards)
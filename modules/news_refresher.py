@@ -0,0 +1,133 @@
+"""
+Background news refresh, decoupled from the Streamlit request path.
+
+One daemon thread per process runs an incremental crawl every
+NEWS_REFRESH_INTERVAL seconds (default 3600, 0 disables). A process-local
+lock plus an exclusive lock file make the crawl single-flight even with
+several app processes on one host, and news_fetcher publishes the CSV by
+atomic rename, so pages only ever read a complete snapshot.
+
+An incremental crawl that finds nothing new leaves the CSV untouched, so
+the time of the last completed crawl is kept separately, as the mtime of
+LAST_CRAWL_PATH; scheduling, the manual-refresh throttle and the "Last
+updated" caption all go by last_crawl_age().
+"""
+import os
+import threading
+import time
+
+from modules import tracing
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+NEWS_CSV_PATH = "./assets/agriculture_news.csv"
+LOCK_PATH = "./assets/.news_refresh.lock"
+LAST_CRAWL_PATH = "./assets/.news_last_crawl"
+REFRESH_INTERVAL = int(os.environ.get("NEWS_REFRESH_INTERVAL", "3600"))
+MIN_MANUAL_INTERVAL = 300  # seconds between user-requested refreshes
+
+_refresh_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def snapshot_age(filename=NEWS_CSV_PATH):
+    """Return seconds since the news CSV was last published, or None if it doesn't exist."""
+    try:
+        return time.time() - os.path.getmtime(filename)
+    except OSError:
+        return None
+
+
+def last_crawl_age():
+    """Return seconds since the last completed crawl, falling back to the CSV's age before the first one."""
+    try:
+        return time.time() - os.path.getmtime(LAST_CRAWL_PATH)
+    except OSError:
+        return snapshot_age()
+
+
+def _mark_crawled():
+    with open(LAST_CRAWL_PATH, "a"):
+        pass
+    os.utime(LAST_CRAWL_PATH)
+
+
+def is_refreshing():
+    """Return True while this process is running a crawl."""
+    return _refresh_lock.locked()
+
+
+def refresh(language="en"):
+    """
+    Run one incremental crawl unless another one is already running.
+
+    Returns:
+        bool: True if this call ran the crawl.
+    """
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+    try:
+        with open(LOCK_PATH, "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False  # another process is crawling
+            from modules.news_fetcher import scrapper
+            with tracing.trace("news_refresh"):
+                scrapper(language=language, incremental=True)
+            _mark_crawled()
+            return True
+    except Exception as e:
+        print(f"News refresh failed: {e}")
+        return False
+    finally:
+        _refresh_lock.release()
+
+
+def request_refresh(min_age=MIN_MANUAL_INTERVAL):
+    """
+    Ask the background thread to crawl now, without waiting for it.
+
+    Requests are ignored within min_age of the last completed crawl, so
+    repeated clicks cannot start back-to-back crawls.
+
+    Returns:
+        bool: True if a refresh was scheduled.
+    """
+    age = last_crawl_age()
+    if is_refreshing() or (age is not None and age < min_age):
+        return False
+    if _thread is None:
+        # Scheduled refresh is disabled: run a one-off crawl in the background
+        threading.Thread(target=refresh, name="news-refresh", daemon=True).start()
+    else:
+        _wake.set()
+    return True
+
+
+def _run(interval, language):
+    while True:
+        age = last_crawl_age()
+        if age is None or age >= interval or _wake.is_set():
+            _wake.clear()
+            refresh(language)
+            age = 0
+        _wake.wait(max(interval - age, 1))
+
+
+def start(interval=REFRESH_INTERVAL, language="en"):
+    """Start the refresher thread for this process; later calls are no-ops."""
+    global _thread
+    if interval <= 0:
+        return None
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, args=(interval, language), name="news-refresher", daemon=True)
+            _thread.start()
+    return _thread
@@ -0,0 +1,75 @@
+"""
+Persistent crawl state for the incremental news scrapper.
+
+Keeps, in a small SQLite file:
+  * index pages with their ETag / Last-Modified validators and the article
+    links found on them, so unchanged pages can be answered by a 304;
+  * every article already extracted, so it is never downloaded again.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+NEWS_STORE_PATH = "./assets/news_store.sqlite"
+
+
+class NewsStore:
+    """SQLite-backed store of crawled pages and articles, safe to share between threads."""
+
+    def __init__(self, path=NEWS_STORE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT, fetched_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                " url TEXT PRIMARY KEY, title TEXT, description TEXT, first_seen REAL)"
+            )
+
+    def conditional_headers(self, url):
+        """Return If-None-Match / If-Modified-Since headers for a previously fetched page."""
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def page_links(self, url):
+        """Return the article links recorded for a page on its last full fetch."""
+        with self._lock:
+            row = self._conn.execute("SELECT links FROM pages WHERE url = ?", (url,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save_page(self, url, etag, last_modified, links):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, json.dumps(links), time.time()),
+            )
+
+    def unseen(self, urls):
+        """Return the URLs, in order, that have not been extracted yet."""
+        with self._lock:
+            seen = {row[0] for row in self._conn.execute("SELECT url FROM articles")}
+        return [url for url in urls if url not in seen]
+
+    def save_articles(self, urls, titles, descriptions):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO articles VALUES (?, ?, ?, ?)",
+                [(url, title, description, now) for url, title, description in zip(urls, titles, descriptions)],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
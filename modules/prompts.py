@@ -0,0 +1,75 @@
+"""
+Prompt building shared by the chatbots.
+
+Each bot compiles its prompts once per language at import time. A prompt is
+a system message that never changes between requests (role and language
+instructions) followed by one human message with the per-request parts, so
+providers that cache prompt prefixes can reuse the system part.
+
+Retrieved chunks overlap by design (see create_vector_db.py) and PDF text is
+full of runs of spaces, so build_context() collapses whitespace, drops
+sentences already seen in a higher-ranked chunk and trims the result to
+CONTEXT_TOKENS before it goes into the prompt.
+"""
+import os
+import re
+
+from modules.chat_memory import count_tokens
+
+CONTEXT_TOKENS = int(os.environ.get("CONTEXT_TOKENS", "1200"))
+
+HUMAN_TEMPLATE = """{history_label}:
+{{chat_history}}
+Context:
+{{retrieved_context}}
+User: {{user_input}}
+AI:"""
+
+# Sentence ends, including the Devanagari danda
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+|\n{2,}")
+
+
+def compile_prompt(preamble, history_label="Chat History"):
+    """
+    Compile a chat prompt with a static system preamble.
+
+    The returned template takes chat_history, retrieved_context and user_input.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", preamble),
+        ("human", HUMAN_TEMPLATE.format(history_label=history_label)),
+    ])
+
+
+def build_context(documents, max_tokens=CONTEXT_TOKENS):
+    """
+    Join retrieved chunks into prompt context, best first.
+
+    Args:
+        documents (list): Retrieved Documents, best first.
+        max_tokens (int): Token budget for the whole context.
+
+    Returns:
+        str: One paragraph per chunk that still had something new to say.
+    """
+    seen = set()
+    paragraphs = []
+    used = 0
+    for document in documents:
+        sentences = []
+        for sentence in _SENTENCE_END.split(document.page_content):
+            sentence = " ".join(sentence.split())
+            if not sentence or sentence.lower() in seen:
+                continue
+            cost = count_tokens(sentence)
+            if used + cost > max_tokens:
+                break
+            seen.add(sentence.lower())
+            sentences.append(sentence)
+            used += cost
+        if sentences:
+            paragraphs.append(" ".join(sentences))
+        if used + 1 > max_tokens:
+            break
+    return "\n\n".join(paragraphs)
@@ -0,0 +1,79 @@
+"""
+Rebuild the FAISS stores for another embedding backend.
+
+Reads the chunks (text and metadata) from the existing stores, embeds them
+with the target backend and publishes them as a new version of the store
+that resources.index_path() resolves for that backend, e.g.
+modules/faiss_index_/local/Schemes. The previous version stays on disk
+until the manifest points at the new one (see vector_stores.publish()), so
+a running app switches over in one step. Start the app with
+EMBEDDING_BACKEND=<backend> to use them.
+
+Usage:
+    python -m modules.reembed_index --backend local
+    python -m modules.reembed_index --backend local --store Schemes
+"""
+import argparse
+import time
+
+from modules import resources, vector_stores
+from modules.create_vector_db import publish_store, read_sources
+from modules.faiss_indexes import build_vector_store
+
+STORES = ["Smart Farming", "Schemes"]
+
+
+def load_documents(path):
+    """Return the docstore ids and documents of a FAISS store in index order."""
+    store = vector_stores.load_store(path, vector_stores.NoEmbeddings())
+    ids = [store.index_to_docstore_id[i] for i in range(len(store.index_to_docstore_id))]
+    return ids, [store.docstore.search(doc_id) for doc_id in ids]
+
+
+def reembed_store(store_name, backend, source_backend="google", batch_size=64):
+    """
+    Re-embed one store with a different backend.
+
+    Returns:
+        str: Directory of the new store.
+    """
+    source = resources.index_path(store_name, source_backend)
+    target = resources.index_path(store_name, backend)
+    ids, documents = load_documents(vector_stores.current_dir(source))
+    embeddings = resources.build_embeddings(backend)
+
+    started = time.perf_counter()
+    texts = [document.page_content for document in documents]
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    # Keep the index type the source store was built with
+    sources = read_sources(source)
+    store = build_vector_store(
+        texts,
+        vectors,
+        embeddings,
+        metadatas=[document.metadata for document in documents],
+        ids=ids,
+        index_type=(sources or {}).get("index_type", "flat"),
+    )
+
+    # A complete new version is written first and made current by an atomic rename of the manifest
+    version = publish_store(store, target, sources)
+    print(f"{store_name}: {len(texts)} chunks re-embedded with {backend} in {time.perf_counter() - started:.1f}s -> {target} (version {version})")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild FAISS stores for another embedding backend.")
+    parser.add_argument("--backend", required=True, help="Target embedding backend, e.g. local")
+    parser.add_argument("--source-backend", default="google", help="Backend whose stores hold the chunks")
+    parser.add_argument("--store", action="append", choices=STORES, help="Store to rebuild (default: all)")
+    args = parser.parse_args()
+
+    for store_name in args.store or STORES:
+        reembed_store(store_name, args.backend, args.source_backend)
+
+
+if __name__ == "__main__":
+    main()
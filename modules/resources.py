@@ -0,0 +1,286 @@
+"""
+Process-wide registry of heavy, read-only resources.
+
+Streamlit re-runs the page script for every session and every interaction,
+but imported modules live for the whole process. Anything registered here
+(FAISS stores, the crop disease model, LLM and embedding clients) is loaded
+exactly once and shared by every session and thread. Callers must treat the
+returned objects as read-only.
+"""
+import importlib
+import os
+import threading
+import time
+
+MODULES_DIR = os.path.dirname(os.path.abspath(__file__))
+FAISS_INDEX_DIR = os.path.join(MODULES_DIR, "faiss_index_")
+
+_loaders = {}
+_resources = {}
+_stats = {}
+_registry_lock = threading.Lock()
+_load_locks = {}
+_warm_thread = None
+
+
+def _rss_bytes():
+    """Return the current resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Non-Linux fallback: peak RSS is the best the stdlib offers.
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def register(name, loader):
+    """
+    Register a zero-argument loader under the given name.
+
+    Args:
+        name (str): Resource name used with get().
+        loader (callable): Builds the resource; called at most once.
+    """
+    with _registry_lock:
+        _loaders[name] = loader
+        _load_locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    """
+    Return the shared instance of a resource, loading it on first use.
+
+    Concurrent first calls block on a per-resource lock, so the loader runs
+    once even when many sessions start at the same time.
+    """
+    if name in _resources:
+        return _resources[name]
+
+    with _registry_lock:
+        if name not in _loaders:
+            raise KeyError(f"Unknown resource: {name}")
+        lock = _load_locks[name]
+
+    with lock:
+        if name not in _resources:
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            value = _loaders[name]()
+            _stats[name] = {
+                "load_seconds": time.perf_counter() - started,
+                "rss_delta_bytes": max(_rss_bytes() - rss_before, 0),
+                "loaded_at": time.time(),
+            }
+            _resources[name] = value
+    return _resources[name]
+
+
+def register_module(module_name):
+    """
+    Register a lazily imported module as a resource and return its key.
+
+    Importing through the registry puts each heavy subsystem (TensorFlow,
+    LangChain, ...) in the same load time / memory report as the models.
+    """
+    key = f"module:{module_name}"
+    register(key, lambda: importlib.import_module(module_name))
+    return key
+
+
+def import_module(module_name):
+    """Import a module on first use, recording its import time and memory."""
+    return get(register_module(module_name))
+
+
+def registered_names():
+    """Return the names of all registered resources in registration order."""
+    with _registry_lock:
+        return list(_loaders)
+
+
+def warm_names():
+    """
+    Return the resources the app should load ahead of the first request.
+
+    With CROP_INFERENCE_URL set the model is served by the inference service
+    (modules/inference_server.py), so the UI process must not load it.
+    """
+    names = registered_names()
+    if os.environ.get("CROP_INFERENCE_URL"):
+        names = [name for name in names if name not in ("crop_model", "crop_queue")]
+    return names
+
+
+def is_loaded(name):
+    """Return True if the resource has already been loaded."""
+    return name in _resources
+
+
+def warm(names=None, background=False):
+    """
+    Load resources ahead of the first request.
+
+    Args:
+        names (list): Resource names to load (default: every registered one).
+        background (bool): If True, load in a daemon thread and return at once.
+            Repeated background calls reuse the same thread.
+
+    Returns:
+        threading.Thread or None: The warm-up thread when background is True.
+    """
+    global _warm_thread
+    if names is None:
+        names = registered_names()
+
+    def _warm():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"Failed to warm resource {name}: {e}")
+        print(report())
+
+    if not background:
+        _warm()
+        return None
+
+    with _registry_lock:
+        if _warm_thread is None:
+            _warm_thread = threading.Thread(target=_warm, name="resource-warmup", daemon=True)
+            _warm_thread.start()
+    return _warm_thread
+
+
+def stats():
+    """Return load time and resident memory per loaded resource."""
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+def report():
+    """Format stats() as a human readable table."""
+    lines = ["Resource                         load (s)   RSS (MB)"]
+    for name, values in sorted(_stats.items()):
+        lines.append(
+            f"{name:<32} {values['load_seconds']:>8.2f} {values['rss_delta_bytes'] / 2**20:>10.1f}"
+        )
+    lines.append(f"{'process total':<32} {'':>8} {_rss_bytes() / 2**20:>10.1f}")
+    return "\n".join(lines)
+
+
+# --------------------------------------------------------------------
+# Default resources
+
+def secret(key):
+    """Look up an API key in Streamlit secrets, falling back to the environment."""
+    try:
+        import streamlit as st
+        if "general" in st.secrets and key in st.secrets["general"]:
+            return st.secrets["general"][key]
+        if key in st.secrets:
+            return st.secrets[key]
+    except Exception:
+        pass
+    return os.environ.get(key)
+
+
+def _load_llm():
+    # Groq with failover to larger/other models; see modules/llm_gateway.py
+    from modules.llm_gateway import build_gateway
+    return build_gateway(secret)
+
+
+# Embedding backend for queries and indexes: "google" (remote API) or "local"
+# (MiniLM on the CPU, see modules/local_embeddings.py). Vectors from different
+# backends are not comparable, so each backend has its own FAISS stores.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "google")
+
+
+def build_embeddings(backend=EMBEDDING_BACKEND):
+    """Create the embeddings client for a backend."""
+    if backend == "local":
+        from modules.local_embeddings import LocalMiniLMEmbeddings
+        return LocalMiniLMEmbeddings()
+    if backend != "google":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    from modules.embedding_cache import CachedEmbeddings
+    google_api_key = secret("GOOGLE_API_KEY")
+    if google_api_key:
+        os.environ["GOOGLE_API_KEY"] = google_api_key
+    # Repeated queries are answered from the on-disk cache, not the API
+    model_name = "models/text-embedding-004"
+    return CachedEmbeddings(GoogleGenerativeAIEmbeddings(model=model_name), model_name)
+
+
+def index_path(store_name, backend=EMBEDDING_BACKEND):
+    """Directory of a FAISS store built with the given embedding backend."""
+    if backend == "google":
+        return os.path.join(FAISS_INDEX_DIR, store_name)
+    return os.path.join(FAISS_INDEX_DIR, backend, store_name)
+
+
+def open_store(path):
+    """Load one version of a FAISS store with the app's embeddings and search settings."""
+    from modules.faiss_indexes import configure_search
+    from modules.vector_stores import load_store
+    store = load_store(path, get("embeddings"))
+    # Recall/latency knobs for IVF and HNSW stores; flat stores ignore them. Unset or empty keeps the defaults.
+    nprobe = os.environ.get("FAISS_NPROBE", "").strip()
+    ef_search = os.environ.get("FAISS_EF_SEARCH", "").strip()
+    configure_search(store.index, nprobe=int(nprobe) if nprobe else None, ef_search=int(ef_search) if ef_search else None)
+    return store
+
+
+def open_retriever(path):
+    """Load one version of a FAISS store behind a BM25 + vector retriever."""
+    from modules.hybrid_retrieval import HybridRetriever
+    return HybridRetriever(open_store(path))
+
+
+def _vectordb_loader(store_name):
+    def _load():
+        # Swapped for newly published versions by the watcher; see modules/vector_stores.py
+        from modules import vector_stores
+        store = vector_stores.HotStore(index_path(store_name), open_retriever)
+        vector_stores.watch(store)
+        return store
+    return _load
+
+
+def _load_crop_model():
+    # Keras by default; see modules/inference_backends.py for TFLite/ONNX
+    from modules.inference_backends import load_backend
+    return load_backend()
+
+
+def _load_crop_queue():
+    from modules.inference_queue import BatchingQueue
+    model = get("crop_model")
+    return BatchingQueue(
+        model.predict,
+        max_batch_size=int(os.environ.get("CROP_MAX_BATCH", "16")),
+        max_wait_ms=float(os.environ.get("CROP_BATCH_WINDOW_MS", "10")),
+    )
+
+
+def _load_response_cache():
+    from modules.response_cache import ResponseCache
+    return ResponseCache(
+        max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.environ.get("RESPONSE_CACHE_TTL", str(24 * 3600))),
+        similarity_threshold=float(os.environ.get("RESPONSE_CACHE_THRESHOLD", "0.95")),
+        context_threshold=float(os.environ.get("RESPONSE_CACHE_CONTEXT_THRESHOLD", "0.5")),
+    )
+
+
+register("llm", _load_llm)
+register("embeddings", build_embeddings)
+register("vectordb:Smart Farming", _vectordb_loader("Smart Farming"))
+register("vectordb:Schemes", _vectordb_loader("Schemes"))
+register("crop_model", _load_crop_model)
+register("crop_queue", _load_crop_queue)
+register("response_cache", _load_response_cache)
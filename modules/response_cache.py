@@ -0,0 +1,169 @@
+"""
+Response cache for the farming and schemes chatbots.
+
+Answers are stored under the normalized question, the answer language and a
+hash of the retrieved context. A lookup first tries that exact key, then
+falls back to the most similar cached question (cosine similarity of the
+query embeddings) asked of the same bot in the same language, if it is above
+the similarity threshold and its retrieved context mostly overlaps the
+current one (Jaccard similarity of the context paragraphs, i.e. the
+retrieved chunks). Paraphrases often retrieve the same chunks in a different
+order or with one chunk swapped, so requiring an identical context would
+make near-duplicate hits rare. Entries expire after a TTL and the least
+recently used ones are evicted once the cache is full.
+"""
+import hashlib
+import threading
+import unicodedata
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from modules import metrics
+
+
+def normalize_query(text):
+    """
+    Lowercase, drop punctuation and symbols and collapse whitespace.
+
+    Only Unicode punctuation (P*) and symbol (S*) characters are dropped:
+    \\w does not match combining marks, so a regex on it would strip the
+    Devanagari vowel signs and anusvara and turn different Marathi words into
+    one key (माती and मोती would both become "म त"). The danda is punctuation.
+    """
+    text = "".join(" " if unicodedata.category(char)[0] in "PS" else char for char in text.lower())
+    return " ".join(text.split())
+
+
+def context_hash(context):
+    return hashlib.sha1(context.encode("utf-8")).hexdigest()
+
+
+def context_signature(context):
+    """Return the set of hashed, normalized paragraphs of a context, for overlap checks."""
+    return frozenset(
+        context_hash(normalize_query(paragraph)) for paragraph in context.split("\n\n") if paragraph.strip()
+    )
+
+
+def _overlap(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU + TTL cache with near-duplicate lookup.
+
+    Args:
+        max_entries (int): Size bound; least recently used entries go first.
+        ttl_seconds (float): Age after which an entry is ignored and dropped.
+        similarity_threshold (float): Minimum cosine similarity for a
+            near-duplicate hit; 1.0 disables near-duplicate lookup.
+        context_threshold (float): Minimum share of context paragraphs a
+            near-duplicate hit must have in common with the current context.
+        name (str): Prefix for the hit / miss counters.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=24 * 3600, similarity_threshold=0.95, context_threshold=0.5,
+                 name="response_cache"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.context_threshold = context_threshold
+        self._entries = OrderedDict()  # key -> (response, unit vector, context signature, expires_at)
+        self._buckets = {}  # (namespace, language) -> set of keys
+        self._lock = threading.Lock()
+        self.exact_hits = metrics.counter(f"{name}_exact_hits_total")
+        self.similar_hits = metrics.counter(f"{name}_similar_hits_total")
+        self.misses = metrics.counter(f"{name}_misses_total")
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[:2])
+        if bucket is not None:
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[key[:2]]
+
+    def get(self, namespace, query, language, context, query_vector=None):
+        """
+        Return a cached response or None.
+
+        Args:
+            namespace (str): Which bot is asking, e.g. "ai_bot" or "schemes".
+            query (str): The user's question.
+            language (str): Answer language.
+            context (str): Retrieved context that would be sent to the LLM.
+            query_vector (list): Embedding of the question, for near-duplicate lookup.
+        """
+        bucket_key = (namespace, language)
+        key = bucket_key + (context_hash(context), normalize_query(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits.inc()
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+
+            if query_vector is not None and self.similarity_threshold < 1.0:
+                vector = _unit(query_vector)
+                signature = None
+                best_key, best_score = None, self.similarity_threshold
+                for candidate in list(self._buckets.get(bucket_key, ())):
+                    response, candidate_vector, candidate_signature, expires_at = self._entries[candidate]
+                    if expires_at <= now:
+                        self._remove(candidate)
+                        continue
+                    if candidate_vector is None:
+                        continue
+                    score = float(np.dot(vector, candidate_vector))
+                    if score < best_score:
+                        continue
+                    if signature is None:
+                        signature = context_signature(context)
+                    if _overlap(signature, candidate_signature) >= self.context_threshold:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self._entries.move_to_end(best_key)
+                    self.similar_hits.inc()
+                    return self._entries[best_key][0]
+
+        self.misses.inc()
+        return None
+
+    def put(self, namespace, query, language, context, response, query_vector=None):
+        """Store a response; arguments as for get()."""
+        bucket_key = (namespace, language)
+        key = bucket_key + (context_hash(context), normalize_query(query))
+        vector = _unit(query_vector) if query_vector is not None else None
+        signature = context_signature(context)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (response, vector, signature, time.time() + self.ttl_seconds)
+            self._buckets.setdefault(bucket_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        """Return entry count, hit / miss counts and the overall hit rate."""
+        exact, similar, misses = self.exact_hits.value, self.similar_hits.value, self.misses.value
+        lookups = exact + similar + misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": exact,
+            "similar_hits": similar,
+            "misses": misses,
+            "hit_rate": (exact + similar) / lookups if lookups else 0.0,
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
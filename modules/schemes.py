@@ -1,61 +1,62 @@
 import time
 import streamlit as st
 import os
-from langchain import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_groq import ChatGroq
-from langchain.vectorstores import FAISS
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from dotenv import load_dotenv
+from modules import resources, tracing
+from modules.chat_memory import ChatMemory, llm_summarizer
+from modules.llm_streaming import render_stream, stream_tokens
+from modules.prompts import build_context, compile_prompt
 
-# Access Streamlit Secrets directly
-google_api_key = st.secrets["GOOGLE_API_KEY"]
-groq_api_key = st.secrets["GROQ_API_KEY"]
+ROLE = "Role: AI assistant for agriculture schemes. Answer only scheme-related queries.\n"
 
+# Compiled once per language; the system message is identical for every request in that language
+PROMPTS = {
+    "en": compile_prompt(ROLE + "Note: Please answer in English.", history_label="Session History"),
+    "mr": compile_prompt(ROLE + "Note: Give me answer in Marathi", history_label="Session History"),
+}
 
-# Ensure they're available as environment variables if needed elsewhere in the app
-os.environ["GOOGLE_API_KEY"] = google_api_key
+# Hybrid BM25 + FAISS retriever over the current store version (shared by every session, see modules/resources.py)
+def load_vectordb():
+    return resources.get("vectordb:Schemes").current()
 
+# Stream the chatbot response, piece by piece.
+# Standalone questions are answered from the shared response cache when possible.
+def stream_response(user_input, session_history, retriever, language="mr", use_cache=True):
+    # Traced across its yields, so code running between chunks never records into this request
+    return tracing.trace_stream("schemes", _stream_response(user_input, session_history, retriever, language, use_cache))
 
-# Initialize LLM
-llm_llama3 = ChatGroq(
-    model="llama3.1-8b-8192",
-    temperature=0,
-    api_key=groq_api_key,
-)
+def _stream_response(user_input, session_history, retriever, language, use_cache):
+    started = time.perf_counter()
+    # Embed the question once: the vector is used for retrieval and for the cache's near-duplicate lookup
+    with tracing.span("embedding"):
+        query_vector = retriever.embeddings.embed_query(user_input)
+    with tracing.span("retrieval"):
+        relevant_docs = retriever.retrieve(user_input, query_vector)
+    retrieved_context = build_context(relevant_docs)
 
-# Initialize embeddings
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    response_cache = resources.get("response_cache")
+    if use_cache:
+        cached_response = response_cache.get("schemes", user_input, language, retrieved_context, query_vector)
+        if cached_response is not None:
+            yield cached_response
+            return
 
+    prompt = PROMPTS.get(language, PROMPTS["mr"]).format_messages(
+        chat_history=session_history, user_input=user_input, retrieved_context=retrieved_context
+    )
 
-# Load FAISS vector store
-def load_vectordb():
-    PATH = r"modules\faiss_index_\Smart Farming"
-    persisted_vectorstore = FAISS.load_local(PATH, embeddings, allow_dangerous_deserialization=True)
-    return persisted_vectorstore.as_retriever()
+    chunks = []
+    for chunk in stream_tokens(resources.get("llm"), prompt, started):
+        chunks.append(chunk)
+        yield chunk
+    if use_cache:
+        response_cache.put("schemes", user_input, language, retrieved_context, "".join(chunks), query_vector)
 
-# Generate chatbot response
-def generate_response(user_input, session_history, retriever):
-    relevant_docs = retriever.get_relevant_documents(user_input)
-    retrieved_context = "\n\n".join([doc.page_content for doc in relevant_docs])
-    
-    template = """
-    Role: AI assistant for agriculture schemes. Answer only scheme-related queries.
-    Note: Give me answer in Marathi
-    Session History:
-    {session_history}
-    Context:
-    {retrieved_context}
-    User: {user_input}
-    AI:"""
-    
-    prompt = PromptTemplate(input_variables=["session_history", "user_input", "retrieved_context"], template=template)
-    llm_chain = LLMChain(llm=llm_llama3, prompt=prompt)
-    
-    return llm_chain.run({"session_history": session_history, "user_input": user_input, "retrieved_context": retrieved_context})
+# Generate the complete chatbot response
+def generate_response(user_input, session_history, retriever, language="mr", use_cache=True):
+    return "".join(stream_response(user_input, session_history, retriever, language, use_cache))
 
 # Streamlit Chat UI
-def chatbot_ui():
+def chatbot_ui(language="mr"):
     st.markdown("""<style>
     .chat-container { max-width: 700px; margin: auto; }
     .user-message { background-color: #DCF8C6; padding: 10px; border-radius: 10px; margin-bottom: 20px; }
@@ -63,30 +64,40 @@ def chatbot_ui():
     .chat-avatar { width: 40px; height: 40px; border-radius: 50%; }
     </style>""", unsafe_allow_html=True)
 
-    if "session_history" not in st.session_state:
-        st.session_state.session_history = []
+    # Structured, token-budgeted conversation memory (see modules/chat_memory.py)
+    if not isinstance(st.session_state.get("session_history"), ChatMemory):
+        st.session_state.session_history = ChatMemory()
+    memory = st.session_state.session_history
 
-    if "retriever" not in st.session_state:
-        st.session_state.retriever = load_vectordb()
+    retriever = load_vectordb()
     
     st.markdown('<div class="chat-container">', unsafe_allow_html=True)
     
-    for message in st.session_state.session_history:
-        role, content = message.split(":", 1)
-        if role.strip().lower() == "user":
-            st.markdown(f'<div class="user-message">👤 {content.strip()}</div>', unsafe_allow_html=True)
+    for message in memory.messages:
+        if message["role"] == "user":
+            st.markdown(f'<div class="user-message">👤 {message["content"]}</div>', unsafe_allow_html=True)
         else:
-            st.markdown(f'<div class="assistant-message">🤖 {content.strip()}</div>', unsafe_allow_html=True)
+            st.markdown(f'<div class="assistant-message">🤖 {message["content"]}</div>', unsafe_allow_html=True)
     
     user_input = st.text_input("Type your message...", key="user_input", value="", on_change=lambda: st.session_state.update(send_message=True))
     
     if st.session_state.get("send_message", False) or st.button("Send"):
         if user_input:
-            st.session_state.session_history.append(f"User: {user_input}")
-            response = generate_response(user_input, "\n".join(st.session_state.session_history), st.session_state.retriever)
-            st.session_state.session_history.append(f"AI: {response}")
+            st.markdown(f'<div class="user-message">👤 {user_input}</div>', unsafe_allow_html=True)
+            # Tokens are shown as they arrive instead of after the whole answer.
+            # Follow-ups depend on the conversation, so only the first question is cached
+            response = render_stream(
+                stream_response(user_input, memory.prompt_history(), retriever, language, use_cache=len(memory) == 0),
+                st.empty(),
+                '<div class="assistant-message">🤖 {}</div>'
+            )
+            memory.add("user", user_input)
+            memory.add("assistant", response)
+            # Older turns go into the rolling summary once the recent window is full,
+            # off the script thread so the rerun isn't held up by the summary call
+            memory.compact_in_background(llm_summarizer(resources.get("llm")))
             st.session_state["send_message"] = False
-            st.experimental_rerun()
+            st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
 
@@ -0,0 +1,384 @@
+"""
+Request tracing, metrics export and on-demand profiling.
+
+Hot paths are wrapped in spans:
+
+    with tracing.trace("crop_disease"):     # one per request
+        with tracing.span("inference"):
+            ...
+
+A request that streams its answer is a generator, and code between its
+yields belongs to whoever is iterating it, so it is wrapped with
+trace_stream() instead: the trace is installed only while the generator runs
+and the caller's is put back at every yield.
+
+Every span feeds the histogram span_<name>_seconds and, when it raises, the
+counter span_<name>_errors_total, so time per stage is visible in aggregate
+with no sampling. A trace additionally collects the spans run on its thread
+(offset, duration, error) and is kept in a ring buffer of recent traces if it
+failed, took longer than TRACE_SLOW_SECONDS, or was sampled at
+TRACE_SAMPLE_RATE. Spans outside a trace (worker threads, the batching
+queue) only feed the metrics.
+
+start() serves, once per process:
+  GET  /metrics        every modules.metrics histogram and counter, Prometheus text format
+  GET  /traces         recent traces as JSON
+  POST /profile/start  start the sampling profiler (?interval_ms=10, at least 1)
+  POST /profile/stop   stop it and return the collapsed stacks
+  GET  /profile        collapsed stacks so far, for flamegraph.pl or speedscope
+and/or writes the metrics to METRICS_FILE for a node_exporter textfile
+collector.
+
+Configuration (environment):
+  METRICS_PORT          port for the endpoints, 0 to disable (default 0)
+  METRICS_HOST          address to bind (default 127.0.0.1)
+  METRICS_FILE          file to write the metrics to, empty to disable
+  METRICS_FILE_INTERVAL seconds between writes (default 15)
+  TRACE_SAMPLE_RATE     share of traces kept (default 0.01)
+  TRACE_SLOW_SECONDS    traces at least this long are always kept and logged (default 10)
+  TRACE_BUFFER          recent traces kept (default 200)
+  PROFILE               1 to start the profiler with the process
+"""
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from modules import metrics
+
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_FILE = os.environ.get("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = float(os.environ.get("METRICS_FILE_INTERVAL", "15"))
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_SECONDS = float(os.environ.get("TRACE_SLOW_SECONDS", "10"))
+TRACE_BUFFER = int(os.environ.get("TRACE_BUFFER", "200"))
+PROFILE_INTERVAL_MS = 10
+MIN_PROFILE_INTERVAL_MS = 1  # shorter intervals would keep a core busy sampling
+
+_local = threading.local()
+_recent = deque(maxlen=TRACE_BUFFER)
+_profiler = None
+_profiler_lock = threading.Lock()
+_started = False
+_start_lock = threading.Lock()
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+class Trace:
+    """The spans of one request, as run on the thread that started it."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.error = False
+        self.spans = []
+
+    @property
+    def finished(self):
+        return self.seconds is not None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "seconds": self.seconds,
+            "error": self.error,
+            "spans": [
+                {"name": name, "offset": offset, "seconds": seconds, "error": error}
+                for name, offset, seconds, error in self.spans
+            ],
+        }
+
+
+def current_trace():
+    """Return the unfinished trace of this thread, or None."""
+    trace_ = getattr(_local, "trace", None)
+    return trace_ if trace_ is not None and not trace_.finished else None
+
+
+def record(name, seconds, error=False, started=None):
+    """
+    Record a finished span measured by the caller, e.g. across a generator's yields.
+
+    Args:
+        name (str): Span name.
+        seconds (float): Duration.
+        error (bool): Whether the span failed.
+        started (float): time.perf_counter() at its start, for the trace offset.
+    """
+    metric = _metric_name(name)
+    metrics.histogram(f"span_{metric}_seconds").observe(seconds)
+    if error:
+        metrics.counter(f"span_{metric}_errors_total").inc()
+    trace_ = current_trace()
+    if trace_ is not None:
+        offset = (started if started is not None else time.perf_counter() - seconds) - trace_.started
+        trace_.spans.append((name, offset, seconds, error))
+
+
+@contextmanager
+def span(name):
+    """Time a block as a span; exceptions count as errors and are re-raised."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - started, error, started)
+
+
+@contextmanager
+def trace(name):
+    """
+    Trace one request. Inside another trace this is just a span.
+
+    Yields:
+        Trace: The trace, or the enclosing one.
+    """
+    outer = current_trace()
+    if outer is not None:
+        with span(name):
+            yield outer
+        return
+
+    trace_ = Trace(name)
+    _local.trace = trace_
+    try:
+        yield trace_
+    except Exception:
+        trace_.error = True
+        raise
+    finally:
+        if getattr(_local, "trace", None) is trace_:
+            _local.trace = None
+        _finish(trace_)
+
+
+def trace_stream(name, chunks):
+    """
+    Trace one request whose answer is a generator, across all its yields.
+
+    Spans recorded while the generator runs go into the trace; while it is
+    suspended the caller's own trace (or none) is in place. The trace ends
+    when the generator is exhausted, fails or is closed early.
+
+    Args:
+        name (str): Trace name.
+        chunks (iterable): The request's generator.
+
+    Yields:
+        The generator's items.
+    """
+    trace_ = Trace(name)
+    iterator = iter(chunks)
+    try:
+        while True:
+            previous, _local.trace = getattr(_local, "trace", None), trace_
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _local.trace = previous
+            yield chunk
+    except Exception:
+        trace_.error = True
+        raise
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()  # the reader stopped early: let the request clean up
+        _finish(trace_)
+
+
+def _finish(trace_):
+    trace_.seconds = time.perf_counter() - trace_.started
+    record(trace_.name, trace_.seconds, trace_.error)
+    slow = trace_.seconds >= TRACE_SLOW_SECONDS
+    if trace_.error or slow or random.random() < TRACE_SAMPLE_RATE:
+        _recent.append(trace_.to_dict())
+    if slow:
+        stages = ", ".join(f"{span_name} {seconds:.2f}s" for span_name, _, seconds, _ in trace_.spans)
+        print(f"Slow {trace_.name} request: {trace_.seconds:.2f}s ({stages})")
+
+
+def recent_traces():
+    """Return the kept traces, oldest first."""
+    return list(_recent)
+
+
+# --------------------------------------------------------------------
+# Sampling profiler
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for every thread in the process.
+
+    A daemon thread reads sys._current_frames() every interval and counts
+    each distinct stack, so the overhead depends on the interval, not on how
+    much code runs. Stacks are reported in the collapsed format
+    ("thread;outer;...;inner count" per line).
+
+    Args:
+        interval (float): Seconds between samples.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.samples = Counter()
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+def start_profiling(interval_ms=PROFILE_INTERVAL_MS):
+    """Start the sampling profiler; a running one is kept. Returns the profiler."""
+    global _profiler
+    interval_ms = max(interval_ms, MIN_PROFILE_INTERVAL_MS)
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = SamplingProfiler(interval_ms / 1000).start()
+            print(f"Sampling profiler started ({interval_ms} ms interval)")
+        return _profiler
+
+
+def stop_profiling():
+    """Stop the sampling profiler and return its collapsed stacks ("" if it wasn't running)."""
+    global _profiler
+    with _profiler_lock:
+        profiler, _profiler = _profiler, None
+    if profiler is None:
+        return ""
+    profiler.stop()
+    print(f"Sampling profiler stopped after {time.time() - profiler.started_at:.0f}s")
+    return profiler.collapsed()
+
+
+# --------------------------------------------------------------------
+# Export
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send(self, status, body, content_type="text/plain; charset=utf-8"):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.partition("?")[0]
+        if path == "/metrics":
+            self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/traces":
+            self._send(200, json.dumps(recent_traces()), "application/json")
+        elif path == "/profile":
+            profiler = _profiler
+            self._send(200 if profiler else 404, profiler.collapsed() if profiler else "Profiler not running\n")
+        else:
+            self._send(404, "Not found\n")
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        if path == "/profile/start":
+            try:
+                interval_ms = float(parse_qs(query).get("interval_ms", [PROFILE_INTERVAL_MS])[0])
+                if not math.isfinite(interval_ms):
+                    raise ValueError(interval_ms)
+            except ValueError:
+                self._send(400, "interval_ms must be a number of milliseconds\n")
+                return
+            start_profiling(interval_ms)
+            self._send(200, "Profiler running\n")
+        elif path == "/profile/stop":
+            self._send(200, stop_profiling())
+        else:
+            self._send(404, "Not found\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def write_metrics(path):
+    """Write the metrics to a file by atomic rename, so collectors never read a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(metrics.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def _write_loop(path, interval):
+    while True:
+        try:
+            write_metrics(path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+        time.sleep(interval)
+
+
+def start(port=METRICS_PORT, host=METRICS_HOST, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL):
+    """Start the metrics endpoint and/or file writer, once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+
+    if os.environ.get("PROFILE") == "1":
+        start_profiling()
+    if port:
+        try:
+            server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            # Another app process on this host already serves the port
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+        else:
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-endpoint", daemon=True).start()
+            print(f"Metrics endpoint on http://{host}:{port}/metrics")
+    if path:
+        threading.Thread(target=_write_loop, args=(path, interval), name="metrics-writer", daemon=True).start()
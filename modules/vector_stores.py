@@ -0,0 +1,353 @@
+"""
+Versioned FAISS stores that can be republished while the app is running.
+
+A store directory (resources.index_path()) holds one subdirectory per
+published version and a manifest naming the current one:
+
+    faiss_index_/Schemes/
+        manifest.json                       {"version": "20261018-101500123-3fa2c1", ...}
+        versions/20261018-101500123-3fa2c1/ index.faiss, index.pkl, sources.json
+
+publish() writes a complete new version first and then replaces
+manifest.json by atomic rename, so readers see either the old or the new
+version, never a mix. The newest KEEP_VERSIONS versions are kept on disk for
+processes still reading them and for rollback (point the manifest back at an
+older version). A directory without a manifest, as built before versioning,
+is read as a single unversioned store.
+
+In the app each store is a HotStore. A watcher thread polls the manifests
+every VECTOR_STORE_POLL_INTERVAL seconds (0 disables), loads a newly
+published version in the background and swaps it in for new queries.
+Queries already holding the old store finish on it, and it is freed when the
+last of them drops its reference.
+
+A version holds index.faiss and docstore.sqlite (chunk id, text and JSON
+metadata by index position) instead of LangChain's pickled index.pkl. The
+index is memory-mapped read-only, so worker processes on one host share it
+through the page cache, and only the chunks of the top-k hits are read from
+the docstore. Memory-mapping flat and HNSW indexes needs faiss 1.11 or
+later (IO_FLAG_MMAP_IFC); older versions read them into memory, with a
+warning. Directories that still hold index.pkl load the old way;
+convert them with:
+
+    python -m modules.vector_stores convert "modules/faiss_index_/Schemes"
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections.abc import Mapping
+
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+MANIFEST_FILE = "manifest.json"
+VERSIONS_DIR = "versions"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+KEEP_VERSIONS = 3
+POLL_INTERVAL = int(os.environ.get("VECTOR_STORE_POLL_INTERVAL", "30"))
+
+if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+    MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+else:
+    # IO_FLAG_MMAP only maps IVF inverted lists; every other index is read into memory
+    MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    print(
+        f"faiss {faiss.__version__} cannot memory-map flat or HNSW indexes (needs 1.11+); "
+        "each process will hold its own copy of the index"
+    )
+
+_stores = []
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def read_manifest(store_dir):
+    """Return the manifest of a store directory, or None if it is unversioned."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding="utf-8") as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def current_version(store_dir):
+    manifest = read_manifest(store_dir)
+    return manifest["version"] if manifest else None
+
+
+def version_dir(store_dir, version):
+    """Directory of one version; version None is the unversioned layout."""
+    if version is None:
+        return store_dir
+    return os.path.join(store_dir, VERSIONS_DIR, version)
+
+
+def current_dir(store_dir):
+    """Directory holding the files of the current version."""
+    return version_dir(store_dir, current_version(store_dir))
+
+
+def publish(store_dir, write, keep=KEEP_VERSIONS):
+    """
+    Publish a new version of a store.
+
+    Args:
+        store_dir (str): Store directory, e.g. resources.index_path("Schemes").
+        write (callable): Called with an empty directory to write the version into.
+        keep (int): Number of versions to keep on disk, the new one included.
+
+    Returns:
+        str: The new version.
+    """
+    now = time.time()
+    # Sortable by publish time, down to the millisecond
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+    final_dir = version_dir(store_dir, version)
+    tmp_dir = os.path.join(store_dir, VERSIONS_DIR, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+    try:
+        write(tmp_dir)
+        os.replace(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # Per-publisher temp file, so create_vector_db and reembed_index can publish to one store at once
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    tmp_manifest = f"{manifest_path}.{version}.tmp"
+    with open(tmp_manifest, "w", encoding="utf-8") as handle:
+        json.dump({"version": version, "published_at": time.time()}, handle)
+    os.replace(tmp_manifest, manifest_path)
+    prune(store_dir, keep)
+    return version
+
+
+def prune(store_dir, keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions; the current version is always kept."""
+    versions_root = os.path.join(store_dir, VERSIONS_DIR)
+    current = current_version(store_dir)
+    versions = sorted(name for name in os.listdir(versions_root) if not name.startswith("."))
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_root, version), ignore_errors=True)
+
+
+class NoEmbeddings(Embeddings):
+    """Placeholder for tools that only read a store's documents; nothing is embedded."""
+
+    def embed_documents(self, texts):
+        raise RuntimeError(
+            "This store was opened without an embedding model (NoEmbeddings) and can only be read; "
+            "load it with resources.build_embeddings() to add documents"
+        )
+
+    def embed_query(self, text):
+        raise RuntimeError(
+            "This store was opened without an embedding model (NoEmbeddings) and cannot be searched by text; "
+            "load it with resources.build_embeddings() or search with a query vector"
+        )
+
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore over docstore.sqlite; documents are read on demand.
+
+    Versions are never modified after publishing, so the database is opened
+    immutable and a single connection is shared between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def documents(self):
+        """Return every Document in index position order, read in one query."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, text, metadata FROM chunks ORDER BY position").fetchall()
+        return [Document(id=doc_id, page_content=text, metadata=json.loads(metadata)) for doc_id, text, metadata in rows]
+
+    def position_ids(self):
+        return _PositionIds(self)
+
+
+class _PositionIds(Mapping):
+    """Index position -> docstore id, read from the docstore instead of held in memory."""
+
+    def __init__(self, docstore):
+        self._docstore = docstore
+
+    def __getitem__(self, position):
+        with self._docstore._lock:
+            row = self._docstore._conn.execute("SELECT id FROM chunks WHERE position = ?", (int(position),)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __len__(self):
+        with self._docstore._lock:
+            return self._docstore._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+
+def save_store(store, path):
+    """Write a LangChain FAISS store as index.faiss + docstore.sqlite."""
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(store.index, os.path.join(path, INDEX_FILE))
+    conn = sqlite3.connect(os.path.join(path, DOCSTORE_FILE))
+    try:
+        with conn:
+            conn.execute("CREATE TABLE chunks (position INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT, metadata TEXT)")
+            conn.executemany(
+                "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                (
+                    (position, doc_id, document.page_content, json.dumps(document.metadata, default=str))
+                    for position, doc_id in sorted(store.index_to_docstore_id.items())
+                    for document in [store.docstore.search(doc_id)]
+                ),
+            )
+    finally:
+        conn.close()
+
+
+def load_store(path, embeddings, mmap=True):
+    """
+    Load one version of a store.
+
+    Args:
+        path (str): Version directory.
+        embeddings (Embeddings): Used by the store to embed queries.
+        mmap (bool): Memory-map the index and read chunks on demand. Pass
+            False to get an ordinary in-memory store that can be modified.
+    """
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+
+    if not os.path.exists(os.path.join(path, DOCSTORE_FILE)):
+        # Pre-conversion layout with a pickled docstore
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+    index_file = os.path.join(path, INDEX_FILE)
+    docstore = SQLiteDocstore(os.path.join(path, DOCSTORE_FILE))
+    if mmap:
+        return FAISS(embeddings, faiss.read_index(index_file, MMAP_FLAGS), docstore, docstore.position_ids())
+
+    documents = docstore.documents()
+    ids = {position: document.id for position, document in enumerate(documents)}
+    return FAISS(embeddings, faiss.read_index(index_file), InMemoryDocstore(dict(zip(ids.values(), documents))), ids)
+
+
+class HotStore:
+    """
+    The current version of a store, replaced in place when a new one is published.
+
+    Callers take current() once per query and keep using that object, so a
+    swap never changes the store under a running query.
+
+    Args:
+        store_dir (str): Store directory.
+        load (callable): Loads a store from a version directory.
+    """
+
+    def __init__(self, store_dir, load):
+        self.store_dir = store_dir
+        self._load = load
+        self._lock = threading.Lock()
+        self.version = current_version(store_dir)
+        self._store = load(version_dir(store_dir, self.version))
+        self.swapped_at = time.time()
+
+    def current(self):
+        return self._store
+
+    def check(self):
+        """
+        Load and swap in a newly published version, if there is one.
+
+        Returns:
+            bool: True if the store was swapped.
+        """
+        version = current_version(self.store_dir)
+        if version is None or version == self.version:
+            return False
+        if not self._lock.acquire(blocking=False):
+            return False  # already loading
+        try:
+            started = time.perf_counter()
+            store = self._load(version_dir(self.store_dir, version))
+            old, old_version = self._store, self.version
+            self._store, self.version, self.swapped_at = store, version, time.time()
+            print(f"{self.store_dir}: version {version} loaded in {time.perf_counter() - started:.1f}s and swapped in")
+            weakref.finalize(old, print, f"{self.store_dir}: version {old_version} released")
+            return True
+        except Exception as e:
+            print(f"{self.store_dir}: could not load version {version}: {e}")
+            return False
+        finally:
+            self._lock.release()
+
+
+def _watch(interval):
+    while True:
+        time.sleep(interval)
+        for store in list(_stores):
+            store.check()
+
+
+def watch(store, interval=POLL_INTERVAL):
+    """Add a HotStore to the watcher, starting the watcher thread on first use."""
+    global _thread
+    _stores.append(store)
+    if interval <= 0:
+        return None
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_watch, args=(interval,), name="vector-store-watcher", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage versioned FAISS stores.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    convert = subcommands.add_parser("convert", help="Republish the current version without the pickled docstore")
+    convert.add_argument("store_dir", nargs="+", help='Store directory, e.g. "modules/faiss_index_/Schemes"')
+    args = parser.parse_args()
+
+    for store_dir in args.store_dir:
+        source = current_dir(store_dir)
+        if os.path.exists(os.path.join(source, DOCSTORE_FILE)):
+            print(f"{store_dir}: already converted")
+            continue
+        store = load_store(source, NoEmbeddings(), mmap=False)
+        extra = [name for name in os.listdir(source) if name not in (INDEX_FILE, "index.pkl", MANIFEST_FILE, VERSIONS_DIR)]
+
+        def _write(path):
+            save_store(store, path)
+            for name in extra:
+                if os.path.isfile(os.path.join(source, name)):
+                    shutil.copy2(os.path.join(source, name), path)
+
+        print(f"{store_dir}: published version {publish(store_dir, _write)}")
+
+
+if __name__ == "__main__":
+    main()
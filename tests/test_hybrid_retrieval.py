@@ -0,0 +1,11 @@
+from modules.hybrid_retrieval import BM25Index, tokenize
+
+
+def test_tokenize_keeps_vowel_signs_and_drops_the_danda():
+    assert tokenize("पीक विमा योजना। अर्ज करा॥ PMFBY.") == ["पीक", "विमा", "योजना", "अर्ज", "करा", "pmfby"]
+
+
+def test_bm25_matches_a_word_at_the_end_of_a_marathi_sentence():
+    index = BM25Index(["शेतकऱ्यांसाठी पीक विमा योजना।", "कांदा बाजार भाव आज वाढले।"])
+
+    assert [position for position, _ in index.search("योजना", 2)] == [0]
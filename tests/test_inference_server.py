@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from modules import resources
+from modules.inference_queue import BatchingQueue
+from modules.inference_server import InferenceService, make_handler, to_json
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubModel:
+    """Seeded scores for every class, after a fixed delay per batch; records each batch's size."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batch_sizes = []
+
+    def predict(self, batch):
+        from modules.crop_disease_detector import class_names
+        self.batch_sizes.append(len(batch))
+        time.sleep(self.delay)
+        scores = np.random.default_rng(len(batch)).random((len(batch), len(class_names)), dtype=np.float32)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Start the service on a free port with a stub model; yields a function that builds one."""
+    monkeypatch.chdir(REPO_DIR)  # class labels are read from assets/ relative to the repo
+    servers = []
+
+    def start(max_pending=64, delay=0.0, workers=4, model=None):
+        model = model or StubModel(delay)
+        monkeypatch.setitem(resources._resources, "crop_queue", BatchingQueue(model.predict))
+        service = InferenceService(workers=workers, max_pending=max_pending)
+        service.ready.set()
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(service))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append((server, service))
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server, service in servers:
+        server.shutdown()
+        server.server_close()
+        service.pool.shutdown(wait=False)
+
+
+def post(url, body, headers=None):
+    request = urllib.request.Request(f"{url}/predict", data=body, headers=headers or {}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def jpeg_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 240), (60, 140, 60)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_to_json_converts_numpy_scores():
+    result = to_json({
+        "disease": "Tomato___Late_blight",
+        "confidence": np.float32(0.75),
+        "alternatives": [{"disease": "Tomato___healthy", "confidence": np.float32(0.125), "extra": 1}],
+        "remedy": "Remove infected leaves.",
+    })
+
+    assert result == {
+        "disease": "Tomato___Late_blight",
+        "confidence": 0.75,
+        "alternatives": [{"disease": "Tomato___healthy", "confidence": 0.125}],
+        "remedy": "Remove infected leaves.",
+    }
+    assert type(result["confidence"]) is float
+    json.dumps(result)
+
+
+def test_predict_returns_the_result_as_json(serve):
+    url = serve()
+
+    status, result = post(url, jpeg_bytes(), {"Content-Type": "image/jpeg"})
+
+    assert status == 200
+    assert isinstance(result["confidence"], float)
+    assert {"disease", "confidence", "alternatives"} <= set(result)
+
+
+def test_predict_rejects_a_body_that_is_not_an_image(serve):
+    url = serve()
+
+    status, result = post(url, b"definitely not a JPEG")
+
+    assert status == 400
+    assert result["error"].startswith("Could not read the image")
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_predict_rejects_an_invalid_content_length(serve, length):
+    url = serve()
+    connection = HTTPConnection(url.removeprefix("http://"), timeout=10)
+    connection.putrequest("POST", "/predict")
+    connection.putheader("Content-Length", length)
+    connection.endheaders()
+
+    response = connection.getresponse()
+
+    assert response.status == 400
+    assert json.loads(response.read())["error"] == "Invalid Content-Length"
+    connection.close()
+
+
+def test_overload_is_refused_with_503(serve):
+    url = serve(max_pending=1, delay=0.5)
+    results = []
+    first = threading.Thread(target=lambda: results.append(post(url, jpeg_bytes())))
+    first.start()
+    time.sleep(0.2)  # the first request now holds the only slot
+
+    status, result = post(url, jpeg_bytes())
+    first.join()
+
+    assert status == 503
+    assert "pending" in result["error"]
+    assert results[0][0] == 200
+
+
+def test_batches_are_not_limited_by_the_worker_count(serve):
+    model = StubModel(delay=0.3)
+    url = serve(workers=2, model=model)
+    body = jpeg_bytes()
+    results = []
+    clients = [threading.Thread(target=lambda: results.append(post(url, body))) for _ in range(12)]
+
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    assert [status for status, _ in results] == [200] * 12
+    assert max(model.batch_sizes) > 2
+
+
+def test_get_ignores_the_query_string(serve):
+    url = serve()
+
+    with urllib.request.urlopen(f"{url}/healthz?probe=1", timeout=10) as response:
+        assert response.status == 200
@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import pytest
+
+from modules import llm_gateway
+from modules.llm_gateway import LLMGateway, ProviderError, StubProvider, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "RETRY_BACKOFF", 0.01)
+
+
+def test_retries_rate_limits_until_first_token():
+    provider = StubProvider(response="retried answer", failures=2, first_token_delay=0)
+    gateway = LLMGateway([provider], max_retries=2)
+    retries = gateway.retries.value
+
+    assert gateway.invoke("question") == "retried answer"
+    assert provider.calls == 3
+    assert gateway.retries.value - retries == 2
+
+
+def test_fails_over_when_retries_are_exhausted():
+    primary = StubProvider("primary", failures=10, first_token_delay=0)
+    backup = StubProvider("backup", response="backup answer", first_token_delay=0)
+    gateway = LLMGateway([primary, backup], max_retries=1)
+    failovers = gateway.failovers.value
+
+    assert gateway.invoke("question") == "backup answer"
+    assert primary.calls == 2
+    assert backup.calls == 1
+    assert gateway.failovers.value - failovers == 1
+
+
+def test_raises_the_last_error_when_every_provider_fails():
+    gateway = LLMGateway([StubProvider("a", failures=10, first_token_delay=0),
+                          StubProvider("b", failures=10, first_token_delay=0)], max_retries=0)
+
+    with pytest.raises(ProviderError) as error:
+        gateway.invoke("question")
+    assert error.value.status_code == 429
+
+
+def test_hedges_a_slow_provider_and_keeps_the_first_answer():
+    slow = StubProvider("slow", response="slow answer", first_token_delay=2)
+    fast = StubProvider("fast", response="fast answer", first_token_delay=0)
+    gateway = LLMGateway([slow, fast], hedge_after=0.05)
+    hedges = gateway.hedges.value
+
+    started = time.perf_counter()
+    assert gateway.invoke("question") == "fast answer"
+    assert time.perf_counter() - started < 1
+    assert gateway.hedges.value - hedges == 1
+
+
+def test_stalled_stream_fails_after_idle_timeout():
+    provider = StubProvider(response="one two three", first_token_delay=0, token_delay=2)
+    gateway = LLMGateway([provider], idle_timeout=0.05)
+
+    chunks = gateway.stream("question")
+    assert next(chunks) == "one "
+    with pytest.raises(ProviderError, match="no token"):
+        next(chunks)
+
+
+def test_token_bucket_spaces_requests_without_blocking_the_loop():
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        waits = []
+
+        async def take():
+            await bucket.acquire()
+            waits.append(time.monotonic() - started)
+
+        # While three requests wait for tokens, other coroutines keep running
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while len(waits) < 3:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(take(), take(), take(), tick())
+        return waits, ticks
+
+    waits, ticks = asyncio.run(run())
+    assert waits[0] < 0.03
+    assert waits[1] == pytest.approx(0.05, abs=0.03)
+    assert waits[2] == pytest.approx(0.10, abs=0.03)
+    assert ticks >= 5
@@ -0,0 +1,55 @@
+import pytest
+
+from modules.response_cache import ResponseCache, normalize_query
+
+CONTEXT = "PM-KISAN pays 6000 rupees a year.\n\nApply through the CSC centre.\n\nKeep your Aadhaar linked."
+
+
+def test_normalize_query_drops_punctuation_and_case():
+    assert normalize_query("  What is PM-KISAN?? ") == "what is pm kisan"
+
+
+def test_normalize_query_keeps_devanagari_vowel_signs():
+    assert normalize_query("पीक विमा योजना।") == "पीक विमा योजना"
+    assert normalize_query("माती कशी तपासावी?") == "माती कशी तपासावी"
+
+
+@pytest.mark.parametrize("first, second", [("माती", "मोती"), ("कांदा", "कंदा"), ("किती", "काता")])
+def test_different_marathi_words_get_different_keys(first, second):
+    assert normalize_query(first) != normalize_query(second)
+
+
+def test_exact_hit_ignores_case_and_punctuation():
+    cache = ResponseCache()
+    cache.put("schemes", "What is PM-KISAN?", "en", CONTEXT, "answer")
+
+    assert cache.get("schemes", "what is pm kisan", "en", CONTEXT) == "answer"
+
+
+def test_marathi_questions_that_differ_by_a_vowel_sign_do_not_share_an_entry():
+    cache = ResponseCache(similarity_threshold=1.0)
+    cache.put("schemes", "माती परीक्षण योजना?", "mr", CONTEXT, "soil answer")
+
+    assert cache.get("schemes", "मोती परीक्षण योजना?", "mr", CONTEXT) is None
+    assert cache.get("schemes", "माती परीक्षण योजना", "mr", CONTEXT) == "soil answer"
+
+
+def test_near_duplicate_hit_needs_a_similar_question_and_overlapping_context():
+    cache = ResponseCache(similarity_threshold=0.95, context_threshold=0.5)
+    cache.put("schemes", "पीक विमा योजना काय आहे?", "mr", CONTEXT, "insurance answer", [1.0, 0.0, 0.0])
+    reordered = "Apply through the CSC centre.\n\nPM-KISAN pays 6000 rupees a year.\n\nSomething new."
+
+    assert cache.get("schemes", "पीक विम्याची योजना सांगा", "mr", reordered, [0.99, 0.1, 0.0]) == "insurance answer"
+    # Same question vector, but another language, bot or unrelated context
+    assert cache.get("schemes", "पीक विम्याची योजना सांगा", "en", reordered, [0.99, 0.1, 0.0]) is None
+    assert cache.get("ai_bot", "पीक विम्याची योजना सांगा", "mr", reordered, [0.99, 0.1, 0.0]) is None
+    assert cache.get("schemes", "पीक विम्याची योजना सांगा", "mr", "Other text.\n\nMore.", [0.99, 0.1, 0.0]) is None
+    # Unrelated question with the same context
+    assert cache.get("schemes", "कांदा भाव", "mr", CONTEXT, [0.0, 1.0, 0.0]) is None
+
+
+def test_expired_entries_are_not_returned():
+    cache = ResponseCache(ttl_seconds=-1)
+    cache.put("schemes", "question", "en", CONTEXT, "answer", [1.0, 0.0])
+
+    assert cache.get("schemes", "question", "en", CONTEXT, [1.0, 0.0]) is None